@@ -1,13 +1,59 @@
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Iterator
 import re
 import ast
-from utils.openai_client import OpenAIClient
+import io
+import multiprocessing
+import random
+import string
+import tokenize
+from utils.openai_client import OpenAIClient, StreamError
+from utils.response_cache import ResponseCache
+from utils.semantic_cache import SemanticCache
+from utils.content_pool import ContentPool
+from utils import sandbox
 
 class CodeEvaluator:
     """AI agent for evaluating and providing feedback on student code"""
     
-    def __init__(self, openai_client: OpenAIClient):
+    # Similarity needed to reuse a semantically cached response
+    FEEDBACK_SIMILARITY_THRESHOLD = 0.97
+    EXERCISE_SIMILARITY_THRESHOLD = 0.92
+    
+    # Constant instructions sent as the system message, so OpenAI's prompt cache can reuse them
+    EXERCISE_SYSTEM_PROMPT = """Create a fun coding exercise for kids learning Python, based on the module the user describes.
+
+Requirements:
+- Should take 5-10 minutes
+- Be engaging and fun for kids under 15
+- Focus on concepts from this module
+- Include clear instructions
+- Start with an emoji
+
+Return just the exercise description as plain text."""
+    
+    FEEDBACK_SYSTEM_PROMPT = """A student (under 15) wrote Python code for an exercise. The user message contains the exercise, their code and what happened when it ran.
+
+Please provide encouraging feedback that:
+1. Starts with something positive they did well
+2. Explains what their code does in simple terms
+3. If there are errors, explain them gently and suggest fixes
+4. Gives encouragement to keep coding
+5. Uses emojis and kid-friendly language
+
+Keep it concise but supportive!"""
+    
+    # Limits for running a submission in a sandbox worker. The CPU limit caps the run itself; the wall-clock
+    # timeout only has to cover waiting for a free worker and starting the pool on first use
+    SANDBOX_CPU_SECONDS = 1
+    SANDBOX_TIMEOUT = 15
+    SANDBOX_MEMORY_BYTES = 128 * 1024 * 1024
+    
+    def __init__(self, openai_client: OpenAIClient, response_cache: Optional[ResponseCache] = None,
+                 semantic_cache: Optional[SemanticCache] = None, content_pool: Optional[ContentPool] = None):
         self.client = openai_client
+        self.cache = response_cache or ResponseCache()
+        self.semantic_cache = semantic_cache or SemanticCache()
+        self.content_pool = content_pool or ContentPool()
         
         # Safe built-ins for code execution
         self.safe_builtins = {
@@ -19,6 +65,58 @@ class CodeEvaluator:
             'type': type, 'isinstance': isinstance, 'sorted': sorted,
             'reversed': reversed, 'all': all, 'any': any
         }
+        # Copied for each in-process run instead of building the globals dict every time
+        self._globals_template = sandbox.make_globals_template(self.safe_builtins)
+        
+        # Dangerous operations, compiled into a single whitespace-insensitive scan
+        dangerous_keywords = [
+            'import os', 'import sys', 'import subprocess', 'import shutil',
+            'exec(', 'eval(', '__import__', 'compile(',
+            'open(', 'file(', 'input(', 'raw_input(',
+            'delete', 'remove', 'unlink', 'rmdir',
+            'while True:', 'for i in range(1000'
+        ]
+        # Drops spaces/tabs and lowercases ASCII in a single translate() pass
+        self._ws_table = str.maketrans(string.ascii_uppercase, string.ascii_lowercase, ' \t')
+        self._danger_re = re.compile('|'.join(
+            re.escape(keyword.translate(self._ws_table)) for keyword in dangerous_keywords
+        ))
+        
+        # The same rules expressed on the syntax tree, used whenever the code parses
+        self._forbidden_modules = {'os', 'sys', 'subprocess', 'shutil'}
+        self._forbidden_calls = {'exec', 'eval', 'compile', '__import__', 'open', 'file', 'input', 'raw_input'}
+        self._forbidden_methods = {'unlink', 'rmdir', 'rmtree', 'system', 'popen'}
+        self._max_loop_range = 1000
+        
+        self._blank_line_re = re.compile(r'^[ \t]*$', re.MULTILINE)
+        
+        # Kid-friendly tips for common errors, matched with one case-insensitive scan
+        self._error_re = re.compile(
+            r'(?P<syntax>syntax error|invalid syntax)'
+            r'|(?P<name>name.*not defined|not defined.*name)'
+            r'|(?P<indentation>indentation)'
+            r'|(?P<type>type error)'
+            r'|(?P<index>index error)'
+            r'|(?P<zero_division>zero.*division|division.*zero)',
+            re.IGNORECASE | re.DOTALL
+        )
+        self._error_help = {
+            'syntax': "Check your spelling and make sure you have the right symbols like (), [], and quotes!",
+            'name': "Make sure you've created all your variables before using them!",
+            'indentation': "Python is picky about spaces! Make sure your code lines up correctly.",
+            'type': "You might be mixing different types of data. Check if you're trying to add numbers and text!",
+            'index': "You're trying to access something that doesn't exist in your list. Check your list size!",
+            'zero_division': "Oops! You can't divide by zero - that would break math! 😅"
+        }
+        
+        # Module-title keywords that map to a tailored fallback exercise, checked in order
+        self._title_routes = (
+            ('variable', "📦 Create three variables: your name, age, and favorite hobby. Then print them in a sentence!"),
+            ('function', "🔧 Write a function called 'greet_friend' that takes a name and prints 'Hi there, [name]!'"),
+            ('loop', "🔄 Use a loop to print your favorite emoji 5 times!"),
+            ('list', "📋 Create a list of your favorite foods and print each one with a number!")
+        )
+        self._rng = random.Random()
         
         # Exercise templates for different difficulty levels
         self.exercise_templates = {
@@ -48,7 +146,12 @@ class CodeEvaluator:
     def generate_exercise(self, module: Dict[str, Any], difficulty: str = "beginner") -> str:
         """Generate a coding exercise based on module content"""
         
-        # Try to generate with AI first
+        # Pregenerated exercises cost nothing to serve
+        pooled = self.content_pool.get_exercise(module, difficulty)
+        if pooled:
+            return pooled
+        
+        # Otherwise try to generate with AI
         ai_exercise = self.generate_ai_exercise(module, difficulty)
         if ai_exercise:
             return ai_exercise
@@ -58,57 +161,100 @@ class CodeEvaluator:
         
         # Try to customize based on module content
         module_title = module.get('title', '').lower()
+        for keyword, exercise in self._title_routes:
+            if keyword in module_title:
+                return exercise
         
-        if 'variable' in module_title:
-            return "📦 Create three variables: your name, age, and favorite hobby. Then print them in a sentence!"
-        elif 'function' in module_title:
-            return "🔧 Write a function called 'greet_friend' that takes a name and prints 'Hi there, [name]!'"
-        elif 'loop' in module_title:
-            return "🔄 Use a loop to print your favorite emoji 5 times!"
-        elif 'list' in module_title:
-            return "📋 Create a list of your favorite foods and print each one with a number!"
-        else:
-            import random
-            return random.choice(templates)
+        return self._rng.choice(templates)
     
     def generate_ai_exercise(self, module: Dict[str, Any], difficulty: str) -> Optional[str]:
         """Generate exercise using AI based on module content"""
         
-        prompt = f"""
-        Create a fun coding exercise for kids learning Python, based on this module:
+        request = self.prepare_exercise_request(module, difficulty)
+        if request['cached']:
+            return request['cached']
         
-        Module: "{module.get('title', '')}"
-        Content highlights: {str(module.get('content', [])[:3])}
+        try:
+            exercise = self.client.generate_response(
+                request['prompt'], self.EXERCISE_SYSTEM_PROMPT, temperature=0.8, max_tokens=200
+            )
+            return self.store_exercise(request, exercise)
+        except:
+            pass
         
-        Requirements:
-        - Difficulty: {difficulty}
-        - Should take 5-10 minutes
-        - Be engaging and fun for kids under 15
-        - Focus on concepts from this module
-        - Include clear instructions
-        - Start with an emoji
+        return None
+    
+    async def generate_ai_exercise_async(self, module: Dict[str, Any], difficulty: str) -> Optional[str]:
+        """Async version of generate_ai_exercise, run through OpenAIClient.run_batch()"""
         
-        Return just the exercise description as plain text.
-        """
+        request = self.prepare_exercise_request(module, difficulty)
+        if request['cached']:
+            return request['cached']
         
         try:
-            exercise = self.client.generate_response(prompt, temperature=0.8, max_tokens=200)
-            if exercise and len(exercise) > 20 and not exercise.startswith("❌"):
-                return exercise
-        except:
-            pass
+            exercise = await self.client.generate_response_async(
+                request['prompt'], self.EXERCISE_SYSTEM_PROMPT, temperature=0.8, max_tokens=200
+            )
+            return self.store_exercise(request, exercise)
+        except Exception as e:
+            print(f"AI exercise generation failed: {e}")
+        
+        return None
+    
+    def generate_ai_exercises(self, modules: List[Dict[str, Any]], difficulty: str) -> List[Optional[str]]:
+        """Generate AI exercises for several modules concurrently instead of one request at a time"""
+        return self.client.run_batch([
+            self.generate_ai_exercise_async(module, difficulty) for module in modules
+        ])
+    
+    def get_exercise_prompt(self, module: Dict[str, Any], difficulty: str) -> str:
+        """The module-specific part of the exercise request"""
+        return (
+            f"Difficulty: {difficulty}\n"
+            f"Module: \"{module.get('title', '')}\"\n"
+            f"Content highlights: {str(module.get('content', [])[:3])}"
+        )
+    
+    def prepare_exercise_request(self, module: Dict[str, Any], difficulty: str) -> Dict[str, Any]:
+        """Build the exercise prompt and look it up in the exact and semantic caches"""
+        
+        prompt = self.get_exercise_prompt(module, difficulty)
+        
+        cache_key = self.cache.make_key('exercise', module.get('id'), difficulty, prompt, 0.8, 200)
+        semantic_text = f"{difficulty}\n{module.get('title', '')}\n{module.get('content', [])[:3]}"
+        request = {'prompt': prompt, 'cache_key': cache_key, 'semantic_text': semantic_text, 'cached': None}
         
+        request['cached'] = self.cache.get(cache_key)
+        if not request['cached']:
+            similar = self.semantic_cache.lookup('exercise', semantic_text, self.EXERCISE_SIMILARITY_THRESHOLD)
+            if similar:
+                self.cache.set(cache_key, similar)
+                request['cached'] = similar
+        
+        return request
+    
+    def store_exercise(self, request: Dict[str, Any], exercise: str) -> Optional[str]:
+        """Cache a generated exercise if it looks usable, returning it (or None if it doesn't)"""
+        if exercise and len(exercise) > 20 and not exercise.startswith("❌"):
+            # Don't let the "no API key" placeholder outlive the missing key
+            if self.client.client:
+                self.cache.set(request['cache_key'], exercise)
+                self.semantic_cache.add('exercise', request['semantic_text'], exercise)
+            return exercise
         return None
     
     def evaluate_code(self, user_code: str, exercise_description: str) -> str:
         """Evaluate user's code and provide feedback"""
         
+        # Parse once and share the tree between the safety check and execution
+        tree = self.parse_code(user_code)
+        
         # Safety check first
-        if not self.is_code_safe(user_code):
+        if not self.is_code_safe(user_code, tree):
             return "⚠️ This code contains some operations that aren't allowed in our safe environment. Try using basic Python operations like print(), variables, and simple calculations!"
         
         # Try to run the code safely
-        execution_result = self.execute_code_safely(user_code)
+        execution_result = self.execute_code_safely(user_code, tree)
         
         # Get AI feedback
         ai_feedback = self.get_ai_feedback(user_code, exercise_description, execution_result)
@@ -116,120 +262,198 @@ class CodeEvaluator:
         # Combine execution result with AI feedback
         return self.format_evaluation_response(execution_result, ai_feedback)
     
-    def is_code_safe(self, code: str) -> bool:
-        """Check if code is safe to execute"""
+    def evaluate_code_stream(self, user_code: str, exercise_description: str) -> Iterator[str]:
+        """Streaming version of evaluate_code: the execution result comes first, then the AI feedback as it arrives"""
         
-        # List of dangerous operations
-        dangerous_keywords = [
-            'import os', 'import sys', 'import subprocess', 'import shutil',
-            'exec(', 'eval(', '__import__', 'compile(',
-            'open(', 'file(', 'input(', 'raw_input(',
-            'delete', 'remove', 'unlink', 'rmdir',
-            'while True:', 'for i in range(1000'
-        ]
+        tree = self.parse_code(user_code)
+        
+        if not self.is_code_safe(user_code, tree):
+            yield "⚠️ This code contains some operations that aren't allowed in our safe environment. Try using basic Python operations like print(), variables, and simple calculations!"
+            return
         
-        code_lower = code.lower().replace(' ', '')
+        execution_result = self.execute_code_safely(user_code, tree)
+        yield self.format_evaluation_response(execution_result, "") + "\n\n🤖 **Feedback:** "
         
-        for keyword in dangerous_keywords:
-            if keyword.replace(' ', '') in code_lower:
-                return False
+        request = self.prepare_feedback_request(user_code, exercise_description, execution_result)
+        if request['cached']:
+            yield request['cached']
+            return
+        
+        chunks = []
+        failed = False
+        try:
+            for chunk in self.client.generate_response_stream(
+                request['prompt'], self.FEEDBACK_SYSTEM_PROMPT, temperature=0.7, max_tokens=400
+            ):
+                failed = failed or isinstance(chunk, StreamError)
+                chunks.append(chunk)
+                yield chunk
+        except Exception as e:
+            print(f"Streaming feedback failed: {e}")
+            failed = True
+        
+        # A stream that ended in an error is shown but never cached, however it started
+        if not failed:
+            self.store_feedback(request, "".join(chunks))
+        if not chunks:
+            yield self.get_fallback_feedback(execution_result)
+    
+    def parse_code(self, code: str) -> Optional[ast.AST]:
+        """Parse student code, returning None if it isn't valid Python"""
+        try:
+            return ast.parse(code, '<user>')
+        except (SyntaxError, ValueError):
+            return None
+    
+    def is_code_safe(self, code: str, tree: Optional[ast.AST] = None) -> bool:
+        """Check if code is safe to execute"""
         
         # Check code length (prevent very long programs)
         if len(code) > 2000:
             return False
         
-        # Try to parse as valid Python
-        try:
-            ast.parse(code)
-            return True
-        except SyntaxError:
-            return True  # Allow syntax errors for learning
-        except:
-            return False
-    
-    def execute_code_safely(self, code: str) -> Dict[str, Any]:
-        """Safely execute Python code and capture results"""
+        if tree is None:
+            tree = self.parse_code(code)
         
-        try:
-            import io
-            import sys
-            from contextlib import redirect_stdout, redirect_stderr
+        if tree is None:
+            # Allow syntax errors for learning - the code can't run, so a text scan is enough
+            stripped = code.translate(self._ws_table)
+            return not self._danger_re.search(stripped)
+        
+        return not self.has_unsafe_nodes(tree)
+    
+    def has_unsafe_nodes(self, tree: ast.AST) -> bool:
+        """Walk the syntax tree looking for imports, calls and loops we don't allow"""
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                if any(alias.name.split('.')[0] in self._forbidden_modules for alias in node.names):
+                    return True
             
-            # Capture output
-            stdout_buffer = io.StringIO()
-            stderr_buffer = io.StringIO()
+            elif isinstance(node, ast.ImportFrom):
+                if (node.module or '').split('.')[0] in self._forbidden_modules:
+                    return True
             
-            # Create safe execution environment
-            safe_globals = {
-                '__builtins__': self.safe_builtins,
-                '__name__': '__main__'
-            }
-            safe_locals = {}
+            elif isinstance(node, ast.Call):
+                func = node.func
+                if isinstance(func, ast.Name) and func.id in self._forbidden_calls:
+                    return True
+                if isinstance(func, ast.Attribute) and func.attr in self._forbidden_methods:
+                    return True
             
-            # Execute code with output capture
-            with redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer):
-                exec(code, safe_globals, safe_locals)
+            elif isinstance(node, ast.Attribute):
+                # Dunder attributes are the usual way out of a restricted exec
+                if node.attr.startswith('__'):
+                    return True
             
-            output = stdout_buffer.getvalue()
-            errors = stderr_buffer.getvalue()
+            elif isinstance(node, ast.Name):
+                # Keeps student code away from the shared __builtins__ mapping
+                if node.id.startswith('__') and node.id != '__name__':
+                    return True
             
-            return {
-                'success': True,
-                'output': output,
-                'errors': errors if errors else None,
-                'variables': {k: str(v) for k, v in safe_locals.items() if not k.startswith('_')}
-            }
+            elif isinstance(node, ast.While):
+                if isinstance(node.test, ast.Constant) and node.test.value:
+                    return True
             
-        except SyntaxError as e:
-            return {
-                'success': False,
-                'output': '',
-                'errors': f"Syntax Error: {str(e)}",
-                'error_type': 'syntax'
-            }
+            elif isinstance(node, ast.For):
+                it = node.iter
+                if (isinstance(it, ast.Call) and isinstance(it.func, ast.Name) and it.func.id == 'range'
+                        and any(isinstance(arg, ast.Constant) and isinstance(arg.value, int)
+                                and arg.value >= self._max_loop_range for arg in it.args)):
+                    return True
+        
+        return False
+    
+    def execute_code_safely(self, code: str, tree: Optional[ast.AST] = None) -> Dict[str, Any]:
+        """Safely execute Python code in a resource-limited worker process and capture results"""
+        
+        try:
+            pool = sandbox.get_pool(self.SANDBOX_MEMORY_BYTES, self.safe_builtins)
+            if pool is None:
+                return self.execute_code_in_process(code, tree)
+            return pool.apply_async(sandbox.run_submission, (code, self.SANDBOX_CPU_SECONDS)).get(timeout=self.SANDBOX_TIMEOUT)
+        except multiprocessing.TimeoutError:
+            return dict(sandbox.TIMEOUT_RESULT)
         except Exception as e:
+            # Never fall back to running the submission unrestricted in the server process
+            print(f"Sandbox execution failed: {e}")
+            sandbox.reset_pool()
             return {
                 'success': False,
                 'output': '',
-                'errors': str(e),
-                'error_type': 'runtime'
+                'errors': "Your code couldn't be run right now. Please try again in a moment!",
+                'error_type': 'sandbox'
             }
     
+    def execute_code_in_process(self, code: str, tree: Optional[ast.AST] = None) -> Dict[str, Any]:
+        """Execute Python code in this process and capture results"""
+        return sandbox.execute(code, self._globals_template, tree)
+    
     def get_ai_feedback(self, user_code: str, exercise_description: str, 
                        execution_result: Dict[str, Any]) -> str:
         """Get AI-powered feedback on the code"""
         
-        prompt = f"""
-        A student (under 15) wrote this Python code for the exercise: "{exercise_description}"
-        
-        Student's Code:
-        ```python
-        {user_code}
-        ```
-        
-        Execution Result:
-        - Success: {execution_result.get('success')}
-        - Output: {execution_result.get('output', 'None')}
-        - Errors: {execution_result.get('errors', 'None')}
-        
-        Please provide encouraging feedback that:
-        1. Starts with something positive they did well
-        2. Explains what their code does in simple terms
-        3. If there are errors, explain them gently and suggest fixes
-        4. Gives encouragement to keep coding
-        5. Uses emojis and kid-friendly language
-        
-        Keep it concise but supportive!
-        """
+        request = self.prepare_feedback_request(user_code, exercise_description, execution_result)
+        if request['cached']:
+            return request['cached']
         
         try:
-            feedback = self.client.generate_response(prompt, temperature=0.7, max_tokens=400)
-            if feedback and not feedback.startswith("❌"):
+            feedback = self.client.generate_response(
+                request['prompt'], self.FEEDBACK_SYSTEM_PROMPT, temperature=0.7, max_tokens=400
+            )
+            feedback = self.store_feedback(request, feedback)
+            if feedback:
                 return feedback
         except:
             pass
         
-        # Fallback feedback
+        return self.get_fallback_feedback(execution_result)
+    
+    def prepare_feedback_request(self, user_code: str, exercise_description: str,
+                                 execution_result: Dict[str, Any]) -> Dict[str, Any]:
+        """Build the feedback prompt and look it up in the exact and semantic caches"""
+        
+        normalized_code = ResponseCache.normalize_text(user_code)
+        
+        prompt = f"""Exercise: "{exercise_description}"
+
+Student's Code:
+```python
+{normalized_code}
+```
+
+Execution Result:
+- Success: {execution_result.get('success')}
+- Output: {execution_result.get('output', 'None')}
+- Errors: {execution_result.get('errors', 'None')}"""
+        
+        cache_key = self.cache.make_key('feedback', prompt, 0.7, 400)
+        # The output is part of it: two runs that both succeed but print different results need different feedback
+        semantic_text = (
+            f"{exercise_description}\n{SemanticCache.normalize_code(user_code)}\n"
+            f"{execution_result.get('success')}\n{execution_result.get('output')}\n{execution_result.get('errors')}"
+        )
+        request = {'prompt': prompt, 'cache_key': cache_key, 'semantic_text': semantic_text, 'cached': None}
+        
+        request['cached'] = self.cache.get(cache_key)
+        if not request['cached']:
+            similar = self.semantic_cache.lookup('feedback', semantic_text, self.FEEDBACK_SIMILARITY_THRESHOLD)
+            if similar:
+                self.cache.set(cache_key, similar)
+                request['cached'] = similar
+        
+        return request
+    
+    def store_feedback(self, request: Dict[str, Any], feedback: str) -> Optional[str]:
+        """Cache generated feedback if it looks usable, returning it (or None if it doesn't)"""
+        if feedback and not feedback.startswith(("❌", "⏳")):
+            if self.client.client:
+                self.cache.set(request['cache_key'], feedback)
+                self.semantic_cache.add('feedback', request['semantic_text'], feedback)
+            return feedback
+        return None
+    
+    def get_fallback_feedback(self, execution_result: Dict[str, Any]) -> str:
+        """Encouraging feedback for when the AI can't be reached"""
         if execution_result.get('success'):
             return "🎉 Great job! Your code ran successfully! Keep up the awesome work! 🚀"
         else:
@@ -276,30 +500,13 @@ class CodeEvaluator:
     def get_error_help(self, error_message: str) -> str:
         """Provide kid-friendly explanations for common errors"""
         
-        error_lower = error_message.lower()
-        
-        if "syntax error" in error_lower or "invalid syntax" in error_lower:
-            return "Check your spelling and make sure you have the right symbols like (), [], and quotes!"
-        
-        elif "name" in error_lower and "not defined" in error_lower:
-            return "Make sure you've created all your variables before using them!"
-        
-        elif "indentation" in error_lower:
-            return "Python is picky about spaces! Make sure your code lines up correctly."
-        
-        elif "type error" in error_lower:
-            return "You might be mixing different types of data. Check if you're trying to add numbers and text!"
-        
-        elif "index error" in error_lower:
-            return "You're trying to access something that doesn't exist in your list. Check your list size!"
+        match = self._error_re.search(error_message)
+        if match:
+            return self._error_help[match.lastgroup]
         
-        elif "zero" in error_lower and "division" in error_lower:
-            return "Oops! You can't divide by zero - that would break math! 😅"
-        
-        else:
-            return "Don't worry about errors - they're part of learning! Try reading the error message for clues."
+        return "Don't worry about errors - they're part of learning! Try reading the error message for clues."
     
-    def analyze_code_quality(self, code: str) -> Dict[str, Any]:
+    def analyze_code_quality(self, code: str, tree: Optional[ast.AST] = None) -> Dict[str, Any]:
         """Analyze code quality and provide suggestions"""
         
         analysis = {
@@ -309,34 +516,70 @@ class CodeEvaluator:
             'areas_to_improve': []
         }
         
-        lines = code.split('\n')
-        non_empty_lines = [line.strip() for line in lines if line.strip()]
+        # Count non-empty lines without splitting the source into a list
+        line_count = code.count('\n') + 1 if code else 0
+        non_empty_count = line_count - len(self._blank_line_re.findall(code))
         
         # Analyze complexity
-        if len(non_empty_lines) > 15:
+        if non_empty_count > 15:
             analysis['complexity'] = 'complex'
-        elif len(non_empty_lines) > 8:
+        elif non_empty_count > 8:
             analysis['complexity'] = 'moderate'
         
+        if tree is None:
+            tree = self.parse_code(code)
+        
+        has_function = has_print = False
+        variable_names = set()
+        
+        if tree is not None:
+            # One pass over the tree collects everything we report on
+            for node in ast.walk(tree):
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    has_function = True
+                elif isinstance(node, ast.Call):
+                    if isinstance(node.func, ast.Name) and node.func.id == 'print':
+                        has_print = True
+                elif isinstance(node, ast.Assign):
+                    variable_names.update(target.id for target in node.targets if isinstance(target, ast.Name))
+            has_comments = self.has_comments(code)
+        else:
+            # Code that doesn't parse falls back to matching the text
+            non_empty_lines = [line.strip() for line in code.split('\n') if line.strip()]
+            has_function = any('def ' in line for line in non_empty_lines)
+            has_print = any('print(' in line for line in non_empty_lines)
+            has_comments = any('#' in line for line in non_empty_lines)
+            variable_names = set(var for line in non_empty_lines for var in re.findall(r'\b[a-zA-Z_]\w*\s*=', line))
+        
         # Check for good practices
-        if any('def ' in line for line in non_empty_lines):
+        if has_function:
             analysis['good_practices'].append("Great job using functions!")
         
-        if any('#' in line for line in non_empty_lines):
+        if has_comments:
             analysis['good_practices'].append("Nice comments to explain your code!")
         
-        if any('print(' in line for line in non_empty_lines):
+        if has_print:
             analysis['good_practices'].append("Good use of print() to show results!")
         
         # Suggest improvements
-        if not any('print(' in line for line in non_empty_lines):
+        if not has_print:
             analysis['suggestions'].append("Try adding print() statements to see your results!")
         
-        if len(set(var for line in non_empty_lines for var in re.findall(r'\b[a-zA-Z_]\w*\s*=', line))) > 5:
+        if len(variable_names) > 5:
             analysis['suggestions'].append("You're using lots of variables - great for organizing data!")
         
         return analysis
     
+    def has_comments(self, code: str) -> bool:
+        """Check for real comments, ignoring '#' inside strings"""
+        try:
+            for token in tokenize.generate_tokens(io.StringIO(code).readline):
+                if token.type == tokenize.COMMENT:
+                    return True
+        except (tokenize.TokenError, SyntaxError):
+            return '#' in code
+        return False
+    
     def get_code_hints(self, exercise_description: str, user_code: str = "") -> List[str]:
         """Provide hints for coding exercises"""
         
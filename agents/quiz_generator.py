@@ -1,15 +1,63 @@
 from typing import Dict, List, Any, Optional
+import copy
+import itertools
 import json
 import random
+import re
+from functools import lru_cache
+from pydantic import BaseModel, Field, ValidationError, model_validator
 from utils.openai_client import OpenAIClient
 from content.prompts import PromptManager
+from utils.response_cache import ResponseCache
+from utils.content_pool import ContentPool
+
+class QuizQuestion(BaseModel):
+    """Schema for a single quiz question"""
+    type: str
+    question: str
+    explanation: str
+    options: Optional[List[str]] = None
+    correct_answer: Optional[str] = None
+    sample_answer: Optional[str] = None
+    
+    @model_validator(mode='after')
+    def check_type_fields(self):
+        if self.type == 'multiple_choice' and (self.options is None or self.correct_answer is None):
+            raise ValueError('multiple choice questions need options and a correct_answer')
+        if self.type == 'free_response' and self.sample_answer is None:
+            raise ValueError('free response questions need a sample_answer')
+        return self
+
+class Quiz(BaseModel):
+    """Schema for a generated quiz"""
+    questions: List[QuizQuestion] = Field(min_length=1)
 
 class QuizGenerator:
     """AI agent that generates dynamic quizzes based on module content and student performance"""
     
-    def __init__(self, openai_client, prompt_manager):
+    # Tokenizer for free-response keyword matching
+    WORD_RE = re.compile(r"\w+")
+    
+    # Markdown headers ("## Loops") and bold terms ("**Strings**") used as quiz concepts
+    CONCEPT_RE = re.compile(r'^#+\s*(.{1,49}?)[\s#]*$|\*\*(\w[^*\n]{0,48})\*\*', re.MULTILINE)
+    
+    # Simple keyword matching for topics, one named group per topic in priority order
+    TOPIC_RE = re.compile(
+        r'(?P<variables>\bvariable|\bage\b|\bname|\bstore)'
+        r'|(?P<print>\bprint|\bdisplay|\boutput|\bscreen)'
+        r'|(?P<functions>\bfunction|\bdef\b|\bcall|\breturn)'
+        r'|(?P<loops>\bloop|\bfor\b|\bwhile\b|\brepeat)'
+        r'|(?P<conditions>\bif\b|\belse\b|\bcondition|\bcompare)',
+        re.IGNORECASE
+    )
+    
+    def __init__(self, openai_client, prompt_manager, response_cache: Optional[ResponseCache] = None,
+                 content_pool: Optional[ContentPool] = None):
         self.client = openai_client
         self.prompts = prompt_manager
+        self.cache = response_cache or ResponseCache()
+        self.content_pool = content_pool or ContentPool()
+        self._rng = random.Random()
         
         # Fallback quiz templates for when AI generation fails
         self.fallback_templates = {
@@ -41,6 +89,12 @@ class QuizGenerator:
     def generate_quiz(self, module: Dict[str, Any], difficult_topics: List[str] = None) -> Dict[str, Any]:
         """Generate a complete quiz for a module"""
         
+        # Pregenerated quizzes aren't personalized, so only use them when there's nothing to focus on
+        if not difficult_topics:
+            pooled_quiz = self.content_pool.get_quiz(module)
+            if pooled_quiz and self.validate_quiz(pooled_quiz):
+                return pooled_quiz
+        
         # Try to generate quiz using AI
         ai_quiz = self.generate_ai_quiz(module, difficult_topics)
         
@@ -54,15 +108,56 @@ class QuizGenerator:
         """Generate quiz using AI"""
         try:
             prompt = self.prompts.get_quiz_generation_prompt(module, difficult_topics)
-            quiz_response = self.client.generate_json_response(prompt, temperature=0.3)
             
-            if quiz_response and 'questions' in quiz_response:
+            cache_key = self.cache.make_key('quiz', module.get('id'), tuple(difficult_topics or []), prompt, 0.3)
+            cached = self.cache.get(cache_key)
+            if cached:
+                return cached
+            
+            quiz_response = self.client.generate_json_response(
+                prompt, self.prompts.get_quiz_generation_system_prompt(), temperature=0.3
+            )
+            
+            # Only a quiz that passes validation is cached, so a malformed one is retried next time
+            if quiz_response and self.validate_quiz(quiz_response):
+                self.cache.set(cache_key, quiz_response)
                 return quiz_response
         except Exception as e:
             print(f"AI quiz generation failed: {e}")
         
         return None
     
+    async def generate_ai_quiz_async(self, module: Dict[str, Any], 
+                                     difficult_topics: List[str] = None) -> Optional[Dict[str, Any]]:
+        """Async version of generate_ai_quiz, run through OpenAIClient.run_batch()"""
+        try:
+            prompt = self.prompts.get_quiz_generation_prompt(module, difficult_topics)
+            
+            cache_key = self.cache.make_key('quiz', module.get('id'), tuple(difficult_topics or []), prompt, 0.3)
+            cached = self.cache.get(cache_key)
+            if cached:
+                return cached
+            
+            quiz_response = await self.client.generate_json_response_async(
+                prompt, self.prompts.get_quiz_generation_system_prompt(), temperature=0.3
+            )
+            
+            # Only a quiz that passes validation is cached, so a malformed one is retried next time
+            if quiz_response and self.validate_quiz(quiz_response):
+                self.cache.set(cache_key, quiz_response)
+                return quiz_response
+        except Exception as e:
+            print(f"AI quiz generation failed: {e}")
+        
+        return None
+    
+    def generate_ai_quizzes(self, modules: List[Dict[str, Any]], 
+                            difficult_topics: List[str] = None) -> List[Optional[Dict[str, Any]]]:
+        """Generate AI quizzes for several modules concurrently instead of one request at a time"""
+        return self.client.run_batch([
+            self.generate_ai_quiz_async(module, difficult_topics) for module in modules
+        ])
+    
     def generate_fallback_quiz(self, module: Dict[str, Any], difficult_topics: List[str] = None) -> Dict[str, Any]:
         """Generate fallback quiz when AI generation fails"""
         
@@ -79,15 +174,17 @@ class QuizGenerator:
         if module.get('code_examples'):
             questions.extend(self.create_code_example_questions(module))
         
-        # If we still don't have enough questions, use templates
-        while len(questions) < 5:
-            questions.extend(base_questions)
-            if len(questions) >= 5:
-                break
+        # If we still don't have enough questions, use copies of the templates
+        # so personalizing the quiz later can't modify them
+        if base_questions and len(questions) < 5:
+            questions.extend(
+                copy.deepcopy(question)
+                for question in itertools.islice(itertools.cycle(base_questions), 5 - len(questions))
+            )
         
         # Take first 5 questions and shuffle for variety
         questions = questions[:5]
-        random.shuffle(questions)
+        self._rng.shuffle(questions)
         
         return {
             'questions': questions,
@@ -158,62 +255,25 @@ class QuizGenerator:
     
     def extract_key_concepts(self, content: List[str]) -> List[str]:
         """Extract key concepts from module content"""
-        concepts = []
         
-        for line in content:
-            if not isinstance(line, str):
-                continue
-                
-            # Look for headers and important terms
-            if line.startswith('#'):
-                concept = line.strip('#').strip()
-                if 0 < len(concept) < 50:
-                    concepts.append(concept)
-            elif line.startswith('') and line.endswith(''):
-                concept = line.strip('*').strip()
-                if 0 < len(concept) < 50:
-                    concepts.append(concept)
-            elif line.startswith('') and line.endswith(''):
-                concept = line.strip('*').strip()
-                if 0 < len(concept) < 50:
-                    concepts.append(concept)
+        # Look for headers and bold terms in a single scan over all the content
+        text = '\n'.join(line for line in content if isinstance(line, str))
+        concepts = [
+            (match.group(1) or match.group(2)).strip()
+            for match in self.CONCEPT_RE.finditer(text)
+        ]
         
         # Remove duplicates and limit
-        unique_concepts = list(dict.fromkeys(concepts))  # Preserves order while removing duplicates
+        unique_concepts = list(dict.fromkeys(concept for concept in concepts if concept))  # Preserves order while removing duplicates
         return unique_concepts[:5]  # Limit to 5 concepts
     
     def validate_quiz(self, quiz: Dict[str, Any]) -> bool:
         """Validate that a quiz has the required structure"""
         try:
-            if not isinstance(quiz, dict):
-                return False
-            
-            if 'questions' not in quiz:
-                return False
-            
-            questions = quiz['questions']
-            if not isinstance(questions, list) or len(questions) == 0:
-                return False
-            
-            # Validate each question
-            for question in questions:
-                if not isinstance(question, dict):
-                    return False
-                
-                required_fields = ['type', 'question', 'explanation']
-                if not all(field in question for field in required_fields):
-                    return False
-                
-                # Validate specific question types
-                if question['type'] == 'multiple_choice':
-                    if not all(field in question for field in ['options', 'correct_answer']):
-                        return False
-                elif question['type'] == 'free_response':
-                    if 'sample_answer' not in question:
-                        return False
-            
+            Quiz.model_validate(quiz)
             return True
-            
+        except ValidationError:
+            return False
         except Exception as e:
             print(f"Quiz validation error: {e}")
             return False
@@ -258,22 +318,15 @@ class QuizGenerator:
     
     def extract_topic_from_question(self, question: Dict[str, Any]) -> str:
         """Extract the main topic from a question"""
-        question_text = question.get('question', '').lower()
-        
-        # Simple keyword matching for topics
-        topics = {
-            'variables': ['variable', 'age', 'name', 'store'],
-            'print': ['print', 'display', 'output', 'screen'],
-            'functions': ['function', 'def', 'call', 'return'],
-            'loops': ['loop', 'for', 'while', 'repeat'],
-            'conditions': ['if', 'else', 'condition', 'compare']
-        }
-        
-        for topic, keywords in topics.items():
-            if any(keyword in question_text for keyword in keywords):
-                return topic
-        
-        return 'general'
+        return self.get_question_topic(question.get('question', ''))
+    
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def get_question_topic(question_text: str) -> str:
+        """Topic of the question text, earlier groups in TOPIC_RE winning when several topics are mentioned"""
+        # Groups are numbered in TOPIC_RE order, so the lowest lastindex is the highest-priority topic
+        match = min(QuizGenerator.TOPIC_RE.finditer(question_text), key=lambda m: m.lastindex, default=None)
+        return match.lastgroup if match else 'general'
     
     def calculate_score(self, quiz: Dict[str, Any], user_answers: List[str]) -> int:
         """Calculate the score based on user answers"""
@@ -296,11 +349,16 @@ class QuizGenerator:
                     score += 1
             elif question['type'] == 'free_response':
                 # For free response, simple keyword matching
-                sample_answer = question.get('sample_answer', '').lower()
-                user_answer_lower = user_answer.lower()
+                keywords = self.get_answer_keywords(question.get('sample_answer', ''))
                 
                 # Check if key concepts are mentioned
-                if any(word in user_answer_lower for word in sample_answer.split() if len(word) > 3):
+                if keywords and not keywords.isdisjoint(self.WORD_RE.findall(user_answer.lower())):
                     score += 1
         
-        return score
\ No newline at end of file
+        return score
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def get_answer_keywords(sample_answer: str) -> frozenset:
+        """Words longer than 3 letters in a sample answer, computed once per answer"""
+        return frozenset(word for word in QuizGenerator.WORD_RE.findall(sample_answer.lower()) if len(word) > 3)
\ No newline at end of file
@@ -1,23 +1,72 @@
 # Create: PythonStudyBot/agents/rag_engine.py
+"""Retrieval over the Python knowledge base.
+
+Embedding contract: every vector is 384-dim, C-contiguous float32 and L2-normalized
+(see create_embedding), so similarity is a float32 dot product end to end.
+"""
 import sqlite3
 import numpy as np
-import json
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
 from typing import List, Dict, Tuple, Optional
 import os
+import queue
+import threading
+import time
+from utils.vector_index import VectorIndex
+from utils.semantic_cache import SemanticCache
+from utils.response_cache import ResponseCache
+from utils.embedding_model import get_embedding_model
 
 class RAGEngine:
-    def __init__(self, db_path: str = "studybot.db"):
+    # Similarity at which an earlier question's context is reused for a new one
+    CACHE_SIMILARITY_THRESHOLD = 0.95
+    
+    # Rated interactions are written in batches of up to this many, at most this often
+    LEARN_BATCH_SIZE = 32
+    LEARN_FLUSH_INTERVAL = 0.5
+    
+    # Canned answers for greetings and single-topic questions
+    FALLBACK_RESPONSES = {
+        "hello": "Hi! I'm StudyBot, your Python learning companion! 🐍 What would you like to learn about today?",
+        "help": "I can help you learn Python! Try asking about variables, loops, functions, data types, or any Python concept.",
+        "variables": "Variables are like labeled boxes that store information in Python. You create them by assigning values: name = 'Alice'",
+        "loops": "Loops help you repeat code. Use 'for' loops to go through items, and 'while' loops to repeat until a condition changes.",
+        "functions": "Functions are reusable blocks of code. Define them with 'def function_name():' and call them by name.",
+        "error": "Python errors are helpful! Read the error message carefully - it usually tells you what went wrong and where."
+    }
+    # Checked in this order, first match wins
+    FALLBACK_ITEMS = tuple(FALLBACK_RESPONSES.items())
+    
+    def __init__(self, db_path: str = "studybot.db", semantic_cache: Optional[SemanticCache] = None,
+                 response_cache: Optional[ResponseCache] = None):
         self.db_path = db_path
-        # Use a lightweight, fast model that works offline
-        self.model = SentenceTransformer('all-MiniLM-L6-v2')
+        # One long-lived WAL connection for every query; the lock serializes use across threads
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            PRAGMA temp_store=MEMORY;
+            PRAGMA mmap_size=268435456;
+        """)
+        self._lock = threading.Lock()
+        # Identical questions are answered from memory before any embedding work; paraphrases hit the semantic cache
+        self.response_cache = response_cache or ResponseCache(maxsize=1024, persist_path=None)
+        self.semantic_cache = semantic_cache or SemanticCache(maxsize=512)
+        # Contiguous copy of the embedding column, so startup doesn't read every BLOB
+        self.embeddings_path = os.path.splitext(db_path)[0] + "_embeddings"
+        # Good interactions are queued and stored by a background thread, started on first use
+        self._learn_queue = queue.Queue()
+        self._learn_thread = None
+        
+        # Use a lightweight, fast model that works offline, loaded once per process
+        self.model = get_embedding_model('all-MiniLM-L6-v2')
+        self.index = VectorIndex(self.model.get_sentence_embedding_dimension())
         self.init_knowledge_tables()
+        self.load_index()
         self.populate_initial_knowledge()
     
     def init_knowledge_tables(self):
         """Initialize RAG-specific database tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             cursor = conn.cursor()
             
             # Knowledge base table
@@ -34,6 +83,12 @@ class RAGEngine:
                 )
             """)
             
+            # Covers (id, content_type) lookups, so load_index and type filters never read the BLOB pages
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_kb_content_type
+                ON knowledge_base(content_type) WHERE embedding IS NOT NULL
+            """)
+            
             # User interaction vectors for learning
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS interaction_vectors (
@@ -49,81 +104,141 @@ class RAGEngine:
             
             conn.commit()
     
+    def load_index(self):
+        """Load every stored embedding into the in-memory similarity index"""
+        with self._lock, self._conn as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, content_type FROM knowledge_base
+                WHERE embedding IS NOT NULL
+            """)
+            rows = sorted(cursor.fetchall())  # Sorted here so SQLite can answer from the index alone
+        
+        if not rows:
+            return
+        
+        # The saved matrix is only used if it covers exactly the rows in the database
+        if self.index.load(self.embeddings_path, [row[0] for row in rows], [row[1] for row in rows]):
+            return
+        
+        with self._lock, self._conn as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, content_type, embedding FROM knowledge_base
+                WHERE embedding IS NOT NULL ORDER BY id
+            """)
+            rows = cursor.fetchall()
+        
+        embeddings = self.index.from_blobs([row[2] for row in rows])
+        self.index.add([row[0] for row in rows], embeddings, [row[1] for row in rows])
+        self.save_index()
+    
+    def save_index(self):
+        """Write the embedding matrix next to the database"""
+        try:
+            self.index.save(self.embeddings_path)
+        except Exception as e:
+            print(f"Saving embedding matrix failed: {e}")
+    
     def create_embedding(self, text: str) -> np.ndarray:
-        """Create embedding for text"""
-        return self.model.encode(text)
+        """Create a unit-length embedding for text, so cosine similarity is a dot product"""
+        return self.encode([text])[0]
+    
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """Embed several texts in one batch as a float32 (n, dim) matrix of unit vectors"""
+        embeddings = self.model.encode(texts, batch_size=32, convert_to_numpy=True, normalize_embeddings=True)
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
     
     def store_knowledge(self, content: str, content_type: str, 
                        module_name: str = None, difficulty_level: str = "beginner"):
         """Store content with its embedding in the knowledge base"""
-        embedding = self.create_embedding(content)
-        embedding_blob = embedding.tobytes()
+        self.store_knowledge_bulk([{
+            "content": content,
+            "content_type": content_type,
+            "module_name": module_name,
+            "difficulty_level": difficulty_level
+        }])
+    
+    def store_knowledge_bulk(self, items: List[Dict]):
+        """Store several knowledge items with one batched encode and one insert"""
+        if not items:
+            return
         
-        metadata = {
-            "length": len(content),
-            "word_count": len(content.split()),
-            "module": module_name,
-            "difficulty": difficulty_level
-        }
+        embeddings = self.encode([item["content"] for item in items])
+        rows = [self.build_knowledge_row(item, embedding) for item, embedding in zip(items, embeddings)]
         
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             cursor = conn.cursor()
-            cursor.execute("""
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM knowledge_base")
+            last_id = cursor.fetchone()[0]
+            cursor.executemany("""
                 INSERT INTO knowledge_base 
                 (content, content_type, module_name, difficulty_level, embedding, metadata)
                 VALUES (?, ?, ?, ?, ?, ?)
-            """, (content, content_type, module_name, difficulty_level, 
-                  embedding_blob, json.dumps(metadata)))
+            """, rows)
+            cursor.execute("SELECT id FROM knowledge_base WHERE id > ? ORDER BY id", (last_id,))
+            row_ids = [row[0] for row in cursor.fetchall()]
             conn.commit()
+        
+        self.index.add(row_ids, embeddings, [item["content_type"] for item in items])
+        self.save_index()
+    
+    def build_knowledge_row(self, item: Dict, embedding: np.ndarray) -> Tuple:
+        """Build the knowledge_base row for an item and its embedding"""
+        # metadata is left NULL: everything in it is derived from the other columns on read
+        return (item["content"], item["content_type"], item.get("module_name"),
+                item.get("difficulty_level", "beginner"), self.index.to_blob(embedding), None)
+    
+    @staticmethod
+    def build_metadata(content: str, module_name: str, difficulty_level: str) -> Dict:
+        """Metadata for a knowledge entry, computed from its columns"""
+        return {
+            "length": len(content),
+            "word_count": len(content.split()),
+            "module": module_name,
+            "difficulty": difficulty_level
+        }
     
     def find_relevant_content(self, query: str, limit: int = 3, 
-                            content_type: str = None) -> List[Dict]:
-        """Find most relevant content for a query"""
-        query_embedding = self.create_embedding(query)
+                            content_type: str = None, query_embedding: np.ndarray = None,
+                            min_similarity: float = 0.0) -> List[Dict]:
+        """Find most relevant content for a query, skipping rows less similar than min_similarity"""
+        if query_embedding is None:
+            query_embedding = self.create_embedding(query)
         
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
-            # Get all knowledge base entries
-            if content_type:
-                cursor.execute("""
-                    SELECT id, content, content_type, module_name, embedding, metadata
-                    FROM knowledge_base WHERE content_type = ?
-                """, (content_type,))
-            else:
-                cursor.execute("""
-                    SELECT id, content, content_type, module_name, embedding, metadata
-                    FROM knowledge_base
-                """)
-            
-            results = cursor.fetchall()
-            
-        if not results:
+        # Rank in memory, then read only the winning rows
+        ids, scores = self.index.search(query_embedding, limit, content_type, min_similarity)
+        if not len(ids):
             return []
         
-        # Calculate similarities
-        similarities = []
-        for row in results:
-            stored_embedding = np.frombuffer(row[4], dtype=np.float32)
-            similarity = cosine_similarity([query_embedding], [stored_embedding])[0][0]
-            
-            similarities.append({
+        with self._lock, self._conn as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT id, content, content_type, module_name, difficulty_level
+                FROM knowledge_base WHERE id IN ({','.join('?' * len(ids))})
+            """, [int(row_id) for row_id in ids])
+            rows = {row[0]: row for row in cursor.fetchall()}
+        
+        results = []
+        for row_id, similarity in zip(ids, scores):
+            row = rows.get(int(row_id))
+            if row is None:
+                continue
+            results.append({
                 'id': row[0],
                 'content': row[1],
                 'content_type': row[2],
                 'module_name': row[3],
-                'metadata': json.loads(row[5]) if row[5] else {},
+                'metadata': self.build_metadata(row[1], row[3], row[4]),
                 'similarity': float(similarity)
             })
         
-        # Sort by similarity and return top results
-        similarities.sort(key=lambda x: x['similarity'], reverse=True)
-        return similarities[:limit]
+        return results
     
     def populate_initial_knowledge(self):
         """Populate the knowledge base with initial Python learning content"""
         # Check if we already have content
-        with sqlite3.connect(self.db_path) as conn:
+        with self._lock, self._conn as conn:
             cursor = conn.cursor()
             cursor.execute("SELECT COUNT(*) FROM knowledge_base")
             count = cursor.fetchone()[0]
@@ -206,36 +321,43 @@ class RAGEngine:
             }
         ]
         
-        # Store all knowledge
-        for item in python_knowledge:
-            self.store_knowledge(
-                content=item["content"],
-                content_type=item["content_type"],
-                module_name=item["module_name"],
-                difficulty_level=item["difficulty_level"]
-            )
+        # Store all knowledge in one batch
+        self.store_knowledge_bulk(python_knowledge)
         
         print(f"✅ Populated knowledge base with {len(python_knowledge)} entries")
     
     def get_smart_response(self, question: str, chat_history: List = None) -> str:
         """Generate a smart response using RAG"""
-        # Find relevant content
-        relevant_content = self.find_relevant_content(question, limit=3)
+        # A question that is just a canned keyword ("hello", "loops?") doesn't need the model at all.
+        # Longer questions go through retrieval even if they mention one, since the keyword may not be the topic
+        canned = self.FALLBACK_RESPONSES.get(question.lower().strip(" ?!.\t\n"))
+        if canned:
+            return canned
         
-        if not relevant_content:
-            return self.get_fallback_response(question)
+        cache_key = self.response_cache.make_key('rag_response', question)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
         
-        # Create context from relevant content
-        context_parts = []
-        for item in relevant_content:
-            if item['similarity'] > 0.3:  # Only use reasonably similar content
-                context_parts.append(f"• {item['content']}")
+        query_embedding = self.create_embedding(question)
         
-        if not context_parts:
-            return self.get_fallback_response(question)
+        # The same or a paraphrased question gets the earlier context without another search
+        context = self.semantic_cache.lookup_vector('rag_context', query_embedding, self.CACHE_SIMILARITY_THRESHOLD)
         
-        # Generate response based on context
-        context = "\n".join(context_parts)
+        if context is None:
+            # Find relevant content; only reasonably similar rows are returned
+            relevant_content = self.find_relevant_content(question, limit=3, query_embedding=query_embedding,
+                                                          min_similarity=0.3)
+            
+            if not relevant_content:
+                return self.get_fallback_response(question)
+            
+            # Create context from relevant content
+            context_parts = [f"• {item['content']}" for item in relevant_content]
+            
+            # Generate response based on context
+            context = "\n".join(context_parts)
+            self.semantic_cache.add_vector('rag_context', query_embedding, context)
         
         # Simple template-based response generation
         response = f"""Based on what I know about Python:
@@ -246,38 +368,63 @@ Let me help you with your question: "{question}"
 
 Would you like me to explain any of these concepts in more detail or show you some examples?"""
         
+        self.response_cache.set(cache_key, response)
         return response
     
     def get_fallback_response(self, question: str) -> str:
         """Fallback response when no relevant content is found"""
-        fallback_responses = {
-            "hello": "Hi! I'm StudyBot, your Python learning companion! 🐍 What would you like to learn about today?",
-            "help": "I can help you learn Python! Try asking about variables, loops, functions, data types, or any Python concept.",
-            "variables": "Variables are like labeled boxes that store information in Python. You create them by assigning values: name = 'Alice'",
-            "loops": "Loops help you repeat code. Use 'for' loops to go through items, and 'while' loops to repeat until a condition changes.",
-            "functions": "Functions are reusable blocks of code. Define them with 'def function_name():' and call them by name.",
-            "error": "Python errors are helpful! Read the error message carefully - it usually tells you what went wrong and where."
-        }
+        canned = self.get_canned_response(question)
+        if canned:
+            return canned
         
+        return "I'm still learning about that topic! Can you try asking about Python basics like variables, loops, or functions? Or feel free to share what you're trying to do!"
+    
+    def get_canned_response(self, question: str) -> Optional[str]:
+        """Canned answer for the first fallback keyword the question mentions"""
         question_lower = question.lower()
-        for key, response in fallback_responses.items():
+        for key, response in self.FALLBACK_ITEMS:
             if key in question_lower:
                 return response
-        
-        return "I'm still learning about that topic! Can you try asking about Python basics like variables, loops, or functions? Or feel free to share what you're trying to do!"
+        return None
     
     def learn_from_interaction(self, user_id: str, question: str, 
                              answer: str, success_rating: int = 3):
-        """Store successful interactions for future learning"""
+        """Store successful interactions for future learning, without blocking the caller"""
         if success_rating >= 4:  # Only store good interactions
-            embedding = self.create_embedding(question)
-            embedding_blob = embedding.tobytes()
+            if self._learn_thread is None:
+                self._learn_thread = threading.Thread(target=self._flush_learn_loop, daemon=True)
+                self._learn_thread.start()
+            self._learn_queue.put((user_id, question, answer, success_rating))
+    
+    def flush_interactions(self):
+        """Block until every queued interaction has been written"""
+        self._learn_queue.join()
+    
+    def _flush_learn_loop(self):
+        while True:
+            batch = [self._learn_queue.get()]
+            deadline = time.monotonic() + self.LEARN_FLUSH_INTERVAL
+            while len(batch) < self.LEARN_BATCH_SIZE:
+                try:
+                    batch.append(self._learn_queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
             
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO interaction_vectors 
-                    (user_id, question, answer, embedding, success_rating)
-                    VALUES (?, ?, ?, ?, ?)
-                """, (user_id, question, answer, embedding_blob, success_rating))
-                conn.commit()
\ No newline at end of file
+            try:
+                embeddings = self.encode([item[1] for item in batch])
+                rows = [(user_id, question, answer, self.index.to_blob(embedding), success_rating)
+                        for (user_id, question, answer, success_rating), embedding in zip(batch, embeddings)]
+                
+                with self._lock, self._conn as conn:
+                    cursor = conn.cursor()
+                    cursor.executemany("""
+                        INSERT INTO interaction_vectors 
+                        (user_id, question, answer, embedding, success_rating)
+                        VALUES (?, ?, ?, ?, ?)
+                    """, rows)
+                    conn.commit()
+            except Exception as e:
+                print(f"Storing interactions failed: {e}")
+            finally:
+                for _ in batch:
+                    self._learn_queue.task_done()
\ No newline at end of file
@@ -1,141 +1,343 @@
-from typing import Dict, List, Any, Optional
-import json
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+from collections import OrderedDict
+import itertools
+import os
 import re
-from utils.openai_client import OpenAIClient
+import threading
+from enum import IntEnum
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:  # Optional; repeats are then detected by substring containment
+    fuzz = None
+
+try:
+    import ahocorasick
+except ImportError:  # Optional; each keyword category is then matched with its own regex
+    ahocorasick = None
+
+from utils.openai_client import OpenAIClient, StreamError
+import numpy as np
+from pydantic import BaseModel, ConfigDict
 from content.prompts import PromptManager
+from utils.response_cache import ResponseCache
+from utils.semantic_cache import SemanticCache
+
+
+def _keyword_re(keywords: List[str]) -> re.Pattern:
+    """Case-insensitive pattern matching any of the keywords anywhere in the text"""
+    return re.compile("|".join(map(re.escape, keywords)), re.IGNORECASE)
+
+
+# Keyword categories used to route a message and pick resources (all lowercase)
+_KEYWORDS = {
+    'resources': [
+        'where can i learn', 'learn more about', 'resources', 'links',
+        'youtube', 'videos', 'tutorials', 'websites', 'practice',
+        'more information', 'study materials'
+    ],
+    'direct_answer': [
+        'just tell me', 'give me the answer', 'what is the answer',
+        'i give up', 'i need the answer', 'just show me',
+        'can you tell me', 'please tell me'
+    ],
+    'frustration': [
+        'i don\'t understand', 'this is hard', 'i\'m confused',
+        'i don\'t get it', 'this makes no sense', 'i\'m stuck',
+        'i can\'t do this', 'this is too difficult', 'help me',
+        'i\'m lost', 'what does this mean'
+    ],
+    'topic': [
+        'python', 'variables', 'functions', 'loops', 'lists',
+        'dictionaries', 'conditionals', 'classes', 'modules'
+    ],
+    'video': ['video', 'youtube', 'watch'],
+    'practice': ['practice', 'exercise', 'code'],
+    'game': ['game', 'fun', 'play'],
+}
+_KEYWORD_RES = {category: _keyword_re(keywords) for category, keywords in _KEYWORDS.items()}
+
+
+def _build_keyword_automaton():
+    """One Aho-Corasick automaton over every category's keywords, or None without pyahocorasick"""
+    if ahocorasick is None:
+        return None
+    
+    categories = {}
+    for category, keywords in _KEYWORDS.items():
+        for keyword in keywords:
+            categories.setdefault(keyword, []).append(category)
+    
+    automaton = ahocorasick.Automaton()
+    for keyword, keyword_categories in categories.items():
+        automaton.add_word(keyword, (keyword, tuple(keyword_categories)))
+    automaton.make_automaton()
+    return automaton
+
+
+_KEYWORD_AUTOMATON = _build_keyword_automaton()
+
+
+def _scan_keywords(lowered: str) -> Dict[str, str]:
+    """Map each keyword category found in the lowercased text to its first keyword there"""
+    found = {}
+    if _KEYWORD_AUTOMATON is None:
+        for category, pattern in _KEYWORD_RES.items():
+            match = pattern.search(lowered)
+            if match:
+                found[category] = match.group(0)
+        return found
+    
+    # Single pass over the text; matches arrive by end position, so keep the earliest start per category
+    starts = {}
+    for end, (keyword, categories) in _KEYWORD_AUTOMATON.iter(lowered):
+        start = end - len(keyword) + 1
+        for category in categories:
+            if start < starts.get(category, len(lowered)):
+                starts[category] = start
+                found[category] = keyword
+    return found
+
+
+# Fallback response routing over lowercased input, one named group per category. Short words are
+# matched as whole words so "show" isn't "how" and "this" isn't "hi"
+_FALLBACK_RE = re.compile(
+    r"(?P<question>\b(?:what|how|explain|help)\b)"
+    r"|(?P<python>python)"
+    r"|(?P<concept>function|loop|variable|list|dict)"
+    r"|(?P<greeting>\b(?:hi|hello|hey)\b|good morning|good afternoon)"
+    r"|(?P<encouragement>hard|difficult|stuck|confused|don't understand)"
+    r"|(?P<example>example|show me|demonstrate)"
+)
+_FALLBACK_TEMPLATES = {
+    'python': "🐍 Great question about Python! Python is a friendly programming language that's perfect for beginners. It's used to build websites, games, apps, and even control robots! Python code is easy to read and write - it's almost like writing in English. What would you like to know more about?",
+    'concept': "🤔 That's a fantastic question about programming concepts! In {module_title}, we cover this topic. Try looking at the code examples in this module - they'll show you exactly how it works! Want to try writing some code? Switch to 'Code Practice' mode!",
+    'greeting': "👋 Hello there! Welcome to {module_title}! I'm excited to help you learn Python. What would you like to explore today? You can ask me about Python concepts, request explanations, or even ask for coding challenges!",
+    'encouragement': "💪 Hey, learning programming can be challenging, but you're doing great! Remember: Every expert was once a beginner. Python is designed to be friendly! Try breaking down the problem into smaller steps, and don't hesitate to experiment with the code examples in this module.",
+    'example': "📋 Here's a cool example from {module_title}: {example} - Try running this code! What do you think it will do?",
+    'no_example': "💻 Great idea to look for examples! Check out the code examples section in {module_title} - there are some awesome snippets to try!",
+    # Default response with proactive teaching
+    'default': "🤖 That's an interesting question about {module_title}! Let me help you explore this step by step. Instead of just giving you the answer, let's discover it together! What do you think might happen if we tried a simple example? For instance, what would you expect from this basic Python code: print('Hello')? This will help us understand the concepts better! 🎯",
+}
+
+class LearningResources(BaseModel):
+    """The resource lists the tutor recommends from, as immutable tuples"""
+    model_config = ConfigDict(frozen=True)
+    
+    python_basics: Tuple[str, ...] = ()
+    python_videos: Tuple[str, ...] = ()
+    practice_sites: Tuple[str, ...] = ()
+    python_games: Tuple[str, ...] = ()
+
+
+# Used when content/resources.json is missing or unreadable
+_DEFAULT_RESOURCES = LearningResources.model_validate({
+    "python_basics": [
+        "https://www.python.org/about/gettingstarted/",
+        "https://www.codecademy.com/learn/learn-python-3",
+        "https://python.org/",
+    ],
+    "python_videos": [
+        "Python for Beginners - Programming with Mosh",
+        "Learn Python - Full Course for Beginners - freeCodeCamp",
+        "Python Tutorial - Python for Beginners - Programming with Mosh"
+    ],
+    "practice_sites": [
+        "https://codingbat.com/python",
+        "https://www.hackerrank.com/domains/python",
+        "https://python.org/shell/"
+    ],
+    "python_games": [
+        "https://reeborg.ca/reeborg.html",
+        "https://checkio.org/",
+        "https://codecombat.com/"
+    ]
+})
+
+
+def _load_resources() -> LearningResources:
+    """Load learning resources from content/resources.json"""
+    resources_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                  'content', 'resources.json')
+    try:
+        # Parsed straight from bytes by pydantic-core; keys the tutor doesn't use are ignored
+        with open(resources_path, 'rb') as f:
+            return LearningResources.model_validate_json(f.read())
+    except (OSError, ValueError) as e:
+        print(f"Loading learning resources failed, using defaults: {e}")
+        return _DEFAULT_RESOURCES
+
+
+_RESOURCES = _load_resources()
+
+# Fuzzy score (0-100) at which a message counts as repeating an earlier one
+_REPEAT_SCORE = 85
+
+
+def _is_repeat(current: str, previous: str) -> bool:
+    """Whether current (lowercased) is essentially a repeat of an earlier message"""
+    if fuzz is not None:
+        return fuzz.partial_ratio(current, previous, score_cutoff=_REPEAT_SCORE) >= _REPEAT_SCORE
+    return current in previous
+
+
+class Route(IntEnum):
+    """How the tutor answers a message"""
+    SOCRATIC = 0
+    RESOURCES = 1
+    DIRECT = 2
+    STUCK = 3
+
 
 class SocraticTutor:
     """AI tutor that uses the Socratic method to guide student learning"""
     
-    def __init__(self, openai_client: OpenAIClient, prompt_manager: PromptManager):
+    # Similarity at which an earlier answer to a paraphrased question is reused
+    SIMILARITY_THRESHOLD = 0.92
+    
+    # Similarity a message needs to a topic name when no topic keyword appears in it
+    TOPIC_SIMILARITY_THRESHOLD = 0.5
+    
+    # System messages kept for the most recently used modules
+    SYSTEM_MESSAGE_CACHE_SIZE = 64
+    
+    # Filled in with str.format, so literal braces are doubled
+    UNDERSTANDING_PROMPT = """Evaluate if the student understands the concept of "{concept}" based on their response: "{response}"
+
+Rate understanding on a scale of 1-5:
+1 - No understanding
+2 - Minimal understanding
+3 - Partial understanding
+4 - Good understanding
+5 - Excellent understanding
+
+Return JSON format:
+{{
+    "understanding_level": 3,
+    "explanation": "Student shows partial understanding but needs clarification on...",
+    "next_question": "Can you tell me more about...?"
+}}"""
+    
+    def __init__(self, openai_client: OpenAIClient, prompt_manager: PromptManager,
+                 response_cache: Optional[ResponseCache] = None, semantic_cache: Optional[SemanticCache] = None):
         self.client = openai_client
         self.prompts = prompt_manager
-        self.conversation_context = {}  # Track conversation context per user
-        
-        # Load learning resources
-        self.resources = self.load_resources()
-    
-    def load_resources(self) -> Dict[str, List[str]]:
-        """Load learning resources from JSON file"""
-        try:
-            import os
-            resources_path = os.path.join(os.path.dirname(__file__), '..', 'content', 'resources.json')
-            if os.path.exists(resources_path):
-                with open(resources_path, 'r') as f:
-                    return json.load(f)
-        except:
-            pass
-        
-        # Fallback resources
-        return {
-            "python_basics": [
-                "https://www.python.org/about/gettingstarted/",
-                "https://www.codecademy.com/learn/learn-python-3",
-                "https://python.org/",
-            ],
-            "python_videos": [
-                "Python for Beginners - Programming with Mosh",
-                "Learn Python - Full Course for Beginners - freeCodeCamp",
-                "Python Tutorial - Python for Beginners - Programming with Mosh"
-            ],
-            "practice_sites": [
-                "https://codingbat.com/python",
-                "https://www.hackerrank.com/domains/python",
-                "https://python.org/shell/"
-            ],
-            "python_games": [
-                "https://reeborg.ca/reeborg.html",
-                "https://checkio.org/",
-                "https://codecombat.com/"
-            ]
+        self.cache = response_cache or ResponseCache()
+        self.semantic_cache = semantic_cache or SemanticCache()
+        # System prompts depend only on the module, so each system message is built once and reused as is.
+        # The tutor is shared between sessions, so the LRU is updated under a lock
+        self._system_messages: OrderedDict = OrderedDict()
+        self._system_lock = threading.Lock()
+        # Embeddings of the topic names, computed on first use
+        self._topic_vectors = None
+        
+        # Learning resources are read once per process and shared
+        self.resources = _RESOURCES
+        # They never change, so each section of the resources reply is rendered once up front
+        self._resource_sections = {
+            'video': self.render_resource_section("📺 **Awesome Video Resources:**", self.resources.python_videos),
+            'practice': self.render_resource_section("💻 **Cool Practice Sites:**", self.resources.practice_sites),
+            'game': self.render_resource_section("🎮 **Fun Learning Games:**", self.resources.python_games),
+            'basics': self.render_resource_section("📚 **Great Learning Resources:**", self.resources.python_basics),
         }
     
     def respond(self, user_input: str, module: Dict[str, Any], 
                 chat_history: List[Dict[str, str]]) -> str:
         """Generate a Socratic response to user input"""
-        
-        # Check if user is asking for resources
-        if self.is_asking_for_resources(user_input):
-            return self.provide_resources(user_input)
-        
-        # Check if user explicitly asks for the answer
-        if self.is_asking_for_direct_answer(user_input):
-            return self.provide_direct_answer(user_input, module, chat_history)
-        
-        # Check if user seems stuck or frustrated
-        if self.detect_frustration(user_input, chat_history):
-            return self.handle_stuck_student(user_input, module, chat_history)
-        
-        # Generate Socratic response
-        return self.generate_socratic_response(user_input, module, chat_history)
+        return "".join(self.respond_stream(user_input, module, chat_history)).strip()
+    
+    def respond_stream(self, user_input: str, module: Dict[str, Any],
+                       chat_history: List[Dict[str, str]]) -> Iterator[str]:
+        """Streaming version of respond: Socratic replies arrive in chunks, the other routes in one piece"""
+        # Lowercased and scanned for every keyword category once, shared by routing and the handlers
+        lowered = user_input.lower()
+        keywords = _scan_keywords(lowered)
+        route = self._classify(user_input, chat_history, lowered, keywords)
+        
+        if route == Route.RESOURCES:
+            yield self.provide_resources(user_input, keywords)
+        elif route == Route.DIRECT:
+            yield self.provide_direct_answer(user_input, module, chat_history)
+        elif route == Route.STUCK:
+            yield self.handle_stuck_student(user_input, module, chat_history)
+        else:
+            yield from self.generate_socratic_response_stream(user_input, module, chat_history, lowered)
+    
+    def _classify(self, user_input: str, chat_history: List[Dict[str, str]],
+                  lowered: str, keywords: Dict[str, str]) -> Route:
+        """Pick how to answer a message, highest priority first"""
+        # Asking for resources
+        if 'resources' in keywords:
+            return Route.RESOURCES
+        # Explicitly asking for the answer
+        if 'direct_answer' in keywords:
+            return Route.DIRECT
+        # Stuck or frustrated; the history is only checked when the keywords didn't settle it
+        if 'frustration' in keywords or self.is_repeated_question(user_input, chat_history, lowered):
+            return Route.STUCK
+        return Route.SOCRATIC
     
     def is_asking_for_resources(self, user_input: str) -> bool:
         """Detect if user is asking for learning resources"""
-        resource_keywords = [
-            'where can i learn', 'learn more about', 'resources', 'links',
-            'youtube', 'videos', 'tutorials', 'websites', 'practice',
-            'more information', 'study materials'
-        ]
-        
-        return any(keyword in user_input.lower() for keyword in resource_keywords)
+        return bool(_KEYWORD_RES['resources'].search(user_input))
     
-    def provide_resources(self, user_input: str) -> str:
+    def provide_resources(self, user_input: str, keywords: Optional[Dict[str, str]] = None) -> str:
         """Provide learning resources based on user request"""
+        if keywords is None:
+            keywords = _scan_keywords(user_input.lower())
+        
         # Extract topic from user input
-        topic = self.extract_topic_from_query(user_input)
+        topic = keywords.get('topic') or self.match_topic(user_input) or "Python programming"
         
-        resource_response = f"🌟 Great question! I love that you want to learn more about {topic}! "
+        # Built as a list of fragments and joined once
+        parts = [f"🌟 Great question! I love that you want to learn more about {topic}! "]
         
         # Suggest relevant resources
-        if any(word in user_input.lower() for word in ['video', 'youtube', 'watch']):
-            resource_response += "\n\n📺 **Awesome Video Resources:**\n"
-            for video in self.resources.get('python_videos', [])[:3]:
-                resource_response += f"• {video}\n"
-        
-        if any(word in user_input.lower() for word in ['practice', 'exercise', 'code']):
-            resource_response += "\n\n💻 **Cool Practice Sites:**\n"
-            for site in self.resources.get('practice_sites', [])[:3]:
-                resource_response += f"• {site}\n"
-        
-        if any(word in user_input.lower() for word in ['game', 'fun', 'play']):
-            resource_response += "\n\n🎮 **Fun Learning Games:**\n"
-            for game in self.resources.get('python_games', [])[:3]:
-                resource_response += f"• {game}\n"
+        for section in ('video', 'practice', 'game'):
+            if section in keywords:
+                parts.append(self._resource_sections[section])
         
         # Always include basic resources
-        if "Video Resources" not in resource_response:
-            resource_response += "\n\n📚 **Great Learning Resources:**\n"
-            for resource in self.resources.get('python_basics', [])[:3]:
-                resource_response += f"• {resource}\n"
+        if 'video' not in keywords:
+            parts.append(self._resource_sections['basics'])
         
-        resource_response += "\n\nKeep that curiosity burning! 🔥 Learning never stops being awesome! 🚀"
+        parts.append("\n\nKeep that curiosity burning! 🔥 Learning never stops being awesome! 🚀")
         
-        return resource_response
+        return "".join(parts)
+    
+    @staticmethod
+    def render_resource_section(heading: str, items: Tuple[str, ...]) -> str:
+        """A resources reply section: the heading and the first three items as bullets"""
+        return "".join([f"\n\n{heading}\n", *(f"• {item}\n" for item in items[:3])])
     
     def extract_topic_from_query(self, user_input: str) -> str:
         """Extract the main topic from user's resource request"""
         # Simple extraction - could be improved with NLP
-        common_topics = [
-            'python', 'variables', 'functions', 'loops', 'lists', 
-            'dictionaries', 'conditionals', 'classes', 'modules'
-        ]
-        
-        user_lower = user_input.lower()
-        for topic in common_topics:
-            if topic in user_lower:
-                return topic
+        match = _KEYWORD_RES['topic'].search(user_input)
+        if match:
+            return match.group(0).lower()
         
-        return "Python programming"
+        return self.match_topic(user_input) or "Python programming"
+    
+    def match_topic(self, user_input: str) -> Optional[str]:
+        """The topic name most similar in meaning to the input (e.g. "dicts" -> dictionaries), if close enough"""
+        if self._topic_vectors is None:
+            self._topic_vectors = self.semantic_cache.embed(_KEYWORDS['topic'])
+            if self._topic_vectors is None:
+                self._topic_vectors = False
+        if self._topic_vectors is False:
+            return None
+        
+        query = self.semantic_cache.embed([user_input])[0]
+        scores = self._topic_vectors @ query
+        best = int(np.argmax(scores))
+        if scores[best] > self.TOPIC_SIMILARITY_THRESHOLD:
+            return _KEYWORDS['topic'][best]
+        return None
     
     def is_asking_for_direct_answer(self, user_input: str) -> bool:
         """Detect if user is explicitly asking for the answer"""
-        direct_answer_phrases = [
-            'just tell me', 'give me the answer', 'what is the answer',
-            'i give up', 'i need the answer', 'just show me',
-            'can you tell me', 'please tell me'
-        ]
-        
-        return any(phrase in user_input.lower() for phrase in direct_answer_phrases)
+        return bool(_KEYWORD_RES['direct_answer'].search(user_input))
     
     def provide_direct_answer(self, user_input: str, module: Dict[str, Any], 
                             chat_history: List[Dict[str, str]]) -> str:
@@ -144,41 +346,48 @@ class SocraticTutor:
         acknowledgment = "🌟 Of course! I can see you've been thinking hard about this. "
         
         # Get the explanation
-        system_prompt = self.prompts.get_explanation_system_prompt(module)
-        
         messages = [
-            {"role": "system", "content": system_prompt},
+            self.get_system_message('explain', module),
             {"role": "user", "content": f"Please explain this directly: {user_input}"}
         ]
         
-        explanation = self.client.generate_chat_response(messages, temperature=0.3)
+        # Answers depend only on the module and the question, so paraphrases can share one
+        explanation = self.cached_response(
+            f"direct:{self.module_key(module)}", (messages, 0.3),
+            lambda: self.client.generate_chat_response(messages, temperature=0.3), semantic_text=user_input
+        )
         
         # Add encouragement
         encouragement = "\n\n💪 Now that you know the answer, do you want to try a related question to practice? Learning is all about trying, making mistakes, and growing! 🌱"
         
         return acknowledgment + explanation + encouragement
     
-    def detect_frustration(self, user_input: str, chat_history: List[Dict[str, str]]) -> bool:
+    def detect_frustration(self, user_input: str, chat_history: List[Dict[str, str]],
+                           lowered: Optional[str] = None) -> bool:
         """Detect if student seems frustrated or stuck"""
-        frustration_indicators = [
-            'i don\'t understand', 'this is hard', 'i\'m confused',
-            'i don\'t get it', 'this makes no sense', 'i\'m stuck',
-            'i can\'t do this', 'this is too difficult', 'help me',
-            'i\'m lost', 'what does this mean'
-        ]
-        
-        recent_responses = [msg['content'].lower() for msg in chat_history[-3:] if msg['role'] == 'user']
-        
         # Check current input
-        if any(phrase in user_input.lower() for phrase in frustration_indicators):
+        if _KEYWORD_RES['frustration'].search(user_input):
             return True
         
+        return self.is_repeated_question(user_input, chat_history, lowered)
+    
+    def is_repeated_question(self, user_input: str, chat_history: List[Dict[str, str]],
+                             lowered: Optional[str] = None) -> bool:
+        """Detect if the student is asking what they recently asked again"""
+        # Short inputs never count as a repeat, so don't lowercase the history for them
+        current_lower = lowered or user_input.lower()
+        if len(current_lower) <= 10:
+            return False
+        
+        recent = list(itertools.islice(reversed(chat_history), 3))
+        # The app appends the current message before responding; it shouldn't count as its own repeat
+        if recent and recent[0]['role'] == 'user' and recent[0]['content'] == user_input:
+            recent = recent[1:]
+        
         # Check for repeated similar questions
-        if len(recent_responses) >= 2:
-            current_lower = user_input.lower()
-            for response in recent_responses:
-                if len(current_lower) > 10 and current_lower in response:
-                    return True
+        for msg in recent:
+            if msg['role'] == 'user' and _is_repeat(current_lower, msg['content'].lower()):
+                return True
         
         return False
     
@@ -192,77 +401,84 @@ class SocraticTutor:
             {"role": "user", "content": user_input}
         ]
         
-        return self.client.generate_chat_response(messages, temperature=0.8)
+        return self.cached_response('stuck', (messages, 0.8),
+                                    lambda: self.client.generate_chat_response(messages, temperature=0.8))
     
     def generate_socratic_response(self, user_input: str, module: Dict[str, Any], 
-                                 chat_history: List[Dict[str, str]]) -> str:
+                                 chat_history: List[Dict[str, str]], lowered: Optional[str] = None) -> str:
         """Generate a Socratic method response"""
+        return "".join(self.generate_socratic_response_stream(user_input, module, chat_history, lowered)).strip()
+    
+    def generate_socratic_response_stream(self, user_input: str, module: Dict[str, Any],
+                                          chat_history: List[Dict[str, str]],
+                                          lowered: Optional[str] = None) -> Iterator[str]:
+        """Streaming version of generate_socratic_response that yields text chunks as they arrive"""
         # Check if OpenAI client is available
         if not self.client.client:
-            return self.generate_fallback_response(user_input, module)
-        
-        system_prompt = self.prompts.get_socratic_system_prompt(module)
+            yield self.generate_fallback_response(user_input, module, lowered)
+            return
         
-        # Build conversation context
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add recent chat history for context (limit to avoid token overflow)
-        recent_history = chat_history[-6:] if len(chat_history) > 6 else chat_history
-        for msg in recent_history:
-            messages.append({"role": msg['role'], "content": msg['content']})
-        
-        # Add current user input
-        messages.append({"role": "user", "content": user_input})
-        
-        response = self.client.generate_chat_response(messages, temperature=0.7)
-        
-        # If OpenAI response is empty or error, use fallback
-        if not response or response.startswith("❌") or response.startswith("🤖 I'd love to chat"):
-            return self.generate_fallback_response(user_input, module)
+        # System prompt, recent chat history for context (limited to avoid token overflow), then the current input.
+        # History rows loaded from the database carry extra keys (timestamp) the chat API rejects, so only role/content are sent
+        messages = [
+            self.get_system_message('socratic', module),
+            *({"role": msg["role"], "content": msg["content"]}
+              for msg in itertools.islice(chat_history, max(len(chat_history) - 6, 0), None)),
+            {"role": "user", "content": user_input}
+        ]
         
-        return response
+        lookup = self.lookup_cached_response('socratic', (messages, 0.7))
+        if lookup['cached']:
+            yield lookup['cached']
+            return
+        
+        chunks = []
+        for chunk in self.client.generate_chat_response_stream(messages, temperature=0.7):
+            if isinstance(chunk, StreamError):
+                # Failed before sending anything: answer offline instead. Either way nothing is cached
+                yield chunk if chunks else self.generate_fallback_response(user_input, module, lowered)
+                return
+            chunks.append(chunk)
+            yield chunk
+        
+        if not chunks:
+            yield self.generate_fallback_response(user_input, module, lowered)
+            return
+        
+        # Cached only once the whole response has arrived
+        self.store_cached_response(lookup, "".join(chunks).strip())
     
-    def generate_fallback_response(self, user_input: str, module: Dict[str, Any]) -> str:
+    def generate_fallback_response(self, user_input: str, module: Dict[str, Any],
+                                   lowered: Optional[str] = None) -> str:
         """Generate helpful responses without AI"""
-        user_input_lower = user_input.lower()
         module_title = module.get('title', 'this topic')
+        found = {match.lastgroup for match in _FALLBACK_RE.finditer(lowered or user_input.lower())}
+        
+        # Questions about Python or the module's concepts; other questions get the default
+        if 'question' in found:
+            category = next((c for c in ('python', 'concept') if c in found), 'default')
+        # Then greetings, encouragement requests and example requests, in that order
+        else:
+            category = next((c for c in ('greeting', 'encouragement', 'example') if c in found), 'default')
         
-        # Handle common questions about the current module
-        if any(word in user_input_lower for word in ['what', 'how', 'explain', 'help']):
-            if 'python' in user_input_lower:
-                return f"🐍 Great question about Python! Python is a friendly programming language that's perfect for beginners. It's used to build websites, games, apps, and even control robots! Python code is easy to read and write - it's almost like writing in English. What would you like to know more about?"
-            
-            elif any(word in user_input_lower for word in ['function', 'loop', 'variable', 'list', 'dict']):
-                return f"🤔 That's a fantastic question about programming concepts! In {module_title}, we cover this topic. Try looking at the code examples in this module - they'll show you exactly how it works! Want to try writing some code? Switch to 'Code Practice' mode!"
-        
-        # Handle greetings
-        elif any(word in user_input_lower for word in ['hi', 'hello', 'hey', 'good morning', 'good afternoon']):
-            return f"👋 Hello there! Welcome to {module_title}! I'm excited to help you learn Python. What would you like to explore today? You can ask me about Python concepts, request explanations, or even ask for coding challenges!"
-        
-        # Handle encouragement requests
-        elif any(word in user_input_lower for word in ['hard', 'difficult', 'stuck', 'confused', 'don\'t understand']):
-            return f"💪 Hey, learning programming can be challenging, but you're doing great! Remember: Every expert was once a beginner. Python is designed to be friendly! Try breaking down the problem into smaller steps, and don't hesitate to experiment with the code examples in this module."
-        
-        # Handle examples requests
-        elif any(word in user_input_lower for word in ['example', 'show me', 'demonstrate']):
-            examples = module.get('code_examples', [])
-            if examples:
-                return f"📋 Here's a cool example from {module_title}: {examples[0]} - Try running this code! What do you think it will do?"
-            else:
-                return f"💻 Great idea to look for examples! Check out the code examples section in {module_title} - there are some awesome snippets to try!"
-        
-        # Default response with proactive teaching
-        return f"🤖 That's an interesting question about {module_title}! Let me help you explore this step by step. Instead of just giving you the answer, let's discover it together! What do you think might happen if we tried a simple example? For instance, what would you expect from this basic Python code: print('Hello')? This will help us understand the concepts better! 🎯"
+        examples = module.get('code_examples', [])
+        if category == 'example' and not examples:
+            category = 'no_example'
+        
+        return _FALLBACK_TEMPLATES[category].format(module_title=module_title, example=examples[0] if examples else '')
     
     def explain_topic(self, topic: str, module: Dict[str, Any]) -> str:
         """Provide explanation for a specific topic"""
         if not self.client.client:
             return self.generate_explanation_fallback(topic, module)
         
-        system_prompt = self.prompts.get_explanation_system_prompt(module)
+        system_prompt = self.get_system_prompt('explain', module)
         prompt = f"Please explain '{topic}' in a clear, engaging way for kids."
         
-        response = self.client.generate_response(prompt, system_prompt, temperature=0.5)
+        response = self.cached_response(
+            f"explain:{self.module_key(module)}", (system_prompt, prompt, 0.5),
+            lambda: self.client.generate_response(prompt, system_prompt, temperature=0.5), semantic_text=topic
+        )
         
         # If OpenAI response is empty or error, use fallback
         if not response or response.startswith("❌") or response.startswith("🤖"):
@@ -276,46 +492,36 @@ class SocraticTutor:
         content = module.get('content', [])
         examples = module.get('code_examples', [])
         
-        response = f"📖 Great question about '{topic}'! In {module_title}, "
+        parts = [f"📖 Great question about '{topic}'! In {module_title}, "]
         
-        # Look for relevant content
-        relevant_content = [item for item in content if topic.lower() in item.lower()]
+        # Look for relevant content; only the first match is used
+        topic_lower = topic.lower()
+        relevant_content = next((item for item in content if topic_lower in item.lower()), None)
         if relevant_content:
-            response += f"we learn that {relevant_content[0]} "
+            parts.append(f"we learn that {relevant_content} ")
         
         # Add code examples if available
         if examples:
-            response += f"Here's a code example: {examples[0]} "
+            parts.append(f"Here's a code example: {examples[0]} ")
         
-        response += f"Want to learn more? Try exploring the '{module_title}' content or switch to 'Code Practice' mode to experiment!"
+        parts.append(f"Want to learn more? Try exploring the '{module_title}' content or switch to 'Code Practice' mode to experiment!")
         
-        return response
+        return "".join(parts)
     
     def check_understanding(self, user_response: str, expected_concept: str) -> Dict[str, Any]:
         """Check if user understands a concept based on their response"""
+        # Students often repeat the same answer, so evaluations are cached
+        cache_key = self.cache.make_key('tutor', 'understanding', expected_concept, user_response)
+        result = self.cache.get(cache_key)
+        if result:
+            return result
         
         # Use OpenAI to evaluate understanding
-        evaluation_prompt = f"""
-        Evaluate if the student understands the concept of "{expected_concept}" based on their response: "{user_response}"
-        
-        Rate understanding on a scale of 1-5:
-        1 - No understanding
-        2 - Minimal understanding  
-        3 - Partial understanding
-        4 - Good understanding
-        5 - Excellent understanding
-        
-        Return JSON format:
-        {{
-            "understanding_level": 3,
-            "explanation": "Student shows partial understanding but needs clarification on...",
-            "next_question": "Can you tell me more about...?"
-        }}
-        """
-        
+        evaluation_prompt = self.UNDERSTANDING_PROMPT.format(concept=expected_concept, response=user_response)
         result = self.client.generate_json_response(evaluation_prompt)
         
         if result:
+            self.cache.set(cache_key, result)
             return result
         else:
             # Fallback evaluation
@@ -341,7 +547,8 @@ class SocraticTutor:
         Make it engaging and not intimidating!
         """
         
-        return self.client.generate_response(follow_up_prompt, temperature=0.8)
+        return self.cached_response('follow_up', (follow_up_prompt, 0.8),
+                                    lambda: self.client.generate_response(follow_up_prompt, temperature=0.8))
     
     def celebrate_progress(self, achievement_type: str = "general") -> str:
         """Generate celebratory response for student progress"""
@@ -360,4 +567,74 @@ class SocraticTutor:
             # Student is at appropriate level
             prompt = f"Generate an appropriate follow-up question about {current_topic} at the current difficulty level."
         
-        return self.client.generate_response(prompt, temperature=0.7)
\ No newline at end of file
+        return self.cached_response('adapt', (prompt, 0.7),
+                                    lambda: self.client.generate_response(prompt, temperature=0.7))
+    
+    def get_system_prompt(self, kind: str, module: Dict[str, Any]) -> str:
+        """The 'socratic' or 'explain' system prompt for a module, built on first use"""
+        return self.get_system_message(kind, module)['content']
+    
+    def get_system_message(self, kind: str, module: Dict[str, Any]) -> Dict[str, str]:
+        """The system message for get_system_prompt; shared between requests, so it must not be modified"""
+        # updated_at is stamped by store_modules, so a reloaded module gets a fresh prompt
+        key = (kind, self.module_key(module), module.get('title'), module.get('updated_at'))
+        with self._system_lock:
+            message = self._system_messages.get(key)
+            if message is not None:
+                self._system_messages.move_to_end(key)
+                return message
+        
+        if kind == 'socratic':
+            prompt = self.prompts.get_socratic_system_prompt(module)
+        else:
+            prompt = self.prompts.get_explanation_system_prompt(module)
+        message = {"role": "system", "content": prompt}
+        with self._system_lock:
+            self._system_messages[key] = message
+            if len(self._system_messages) > self.SYSTEM_MESSAGE_CACHE_SIZE:
+                self._system_messages.popitem(last=False)
+        return message
+    
+    @staticmethod
+    def module_key(module: Dict[str, Any]) -> str:
+        return str(module.get('id') or module.get('title', ''))
+    
+    def cached_response(self, namespace: str, request: Any, generate: Callable[[], str],
+                        semantic_text: Optional[str] = None) -> str:
+        """Return a cached response for this exact request (or, with semantic_text, a similar one), else generate it"""
+        lookup = self.lookup_cached_response(namespace, request, semantic_text)
+        if lookup['cached']:
+            return lookup['cached']
+        
+        response = generate()
+        self.store_cached_response(lookup, response)
+        return response
+    
+    def lookup_cached_response(self, namespace: str, request: Any,
+                               semantic_text: Optional[str] = None) -> Dict[str, Any]:
+        """Look a request up in the exact and (with semantic_text) semantic caches
+        
+        Returns the lookup state for store_cached_response, with the response under 'cached' on a hit.
+        """
+        lookup = {'namespace': namespace, 'cache_key': self.cache.make_key('tutor', namespace, request),
+                  'vector': None, 'cached': None}
+        lookup['cached'] = self.cache.get(lookup['cache_key'])
+        if lookup['cached'] or not semantic_text:
+            return lookup
+        
+        # Embedded once: the same vector is used for the lookup and, on a miss, to store the new response
+        vectors = self.semantic_cache.embed([semantic_text])
+        if vectors is not None:
+            lookup['vector'] = vectors[0]
+            similar = self.semantic_cache.lookup_vector(namespace, lookup['vector'], self.SIMILARITY_THRESHOLD)
+            if similar:
+                self.cache.set(lookup['cache_key'], similar)
+                lookup['cached'] = similar
+        return lookup
+    
+    def store_cached_response(self, lookup: Dict[str, Any], response: str):
+        """Cache a generated response unless it's an error or the "no API key" placeholder"""
+        if response and self.client.client and not response.startswith(("❌", "⏳")):
+            self.cache.set(lookup['cache_key'], response)
+            if lookup['vector'] is not None:
+                self.semantic_cache.add_vector(lookup['namespace'], lookup['vector'], response)
\ No newline at end of file
@@ -1,22 +1,41 @@
 import streamlit as st
 import os
-from datetime import datetime, timedelta
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta
+import itertools
 import json
-from typing import Optional, Dict, List
+import re
+import time
+from collections import deque
+from typing import Optional, Dict, List, Tuple
 # Add after existing imports
 from auth.auth_handler import AuthHandler
 # Import custom modules
 from database.db_handler import DatabaseHandler
-from content.github_parser import GitHubParser
-from content.prompts import PromptManager
-from agents.socratic_tutor import SocraticTutor
-from agents.quiz_generator import QuizGenerator
-from agents.code_evaluator import CodeEvaluator
-from utils.openai_client import OpenAIClient
 # Create persistent user ID
 USER_ID_FILE = '.studybot_data/current_user.txt'
+STYLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'style.css')
+CHAT_HISTORY_LIMIT = 200
+CHAT_VISIBLE_MESSAGES = 30
+CHAT_AVATARS = {'assistant': "🤖", 'user': "👦"}
+# Per-question answers and widget state, cleared whenever a new quiz starts
+QUIZ_STATE_PREFIXES = ('quiz_answer_', 'q_radio_', 'q_text_', 'submit_mc_', 'submit_fr_')
+LEARNING_MODE_LABELS = {
+    'socratic': '🤔 Socratic Method',
+    'flashcards': '📚 Flashcards',
+    'quiz': '🧪 Quiz Mode',
+    'explanation': '💡 Explain Topics',
+    'coding': '💻 Code Practice'
+}
+LEARNING_MODES = tuple(LEARNING_MODE_LABELS)
+DIFFICULTY_LEVELS = ('beginner', 'intermediate', 'advanced')
+STAT_CARD_HTML = '<div class="stat-card"><div class="stat-value">{value}</div><div class="stat-label">{label}</div></div>'
 os.makedirs('.studybot_data', exist_ok=True)
 
+def new_chat_history(messages=()) -> deque:
+    """Chat history for session_state, keeping only the newest CHAT_HISTORY_LIMIT messages"""
+    return deque(messages, maxlen=CHAT_HISTORY_LIMIT)
+
 def get_or_create_user_id():
     if os.path.exists(USER_ID_FILE):
         with open(USER_ID_FILE, 'r') as f:
@@ -26,383 +45,213 @@ def get_or_create_user_id():
         with open(USER_ID_FILE, 'w') as f:
             f.write(user_id)
         return user_id
-# Page configuration
-st.set_page_config(
-    page_title="StudyBot - Learn Python with AI",
-    page_icon="🤖",
-    layout="wide",
-    initial_sidebar_state="auto",
-    menu_items={
-        'Get Help': 'https://www.python.org/',
-        'Report a bug': None,
-        'About': "StudyBot - Your Python Learning Buddy! 🐍✨"
-    }
-)
-# Fun, kid-friendly CSS design with animations!
-st.markdown("""
-<style>
-/* Fun Color Palette for Kids */
-:root {
-    --primary: #667eea;
-    --secondary: #764ba2;
-    --success: #48bb78;
-    --warning: #f6ad55;
-    --danger: #fc8181;
-    --info: #4299e1;
-}
 
-/* Animated Space Background */
-.stApp {
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 50%, #f093fb 100%) !important;
-    background-size: 400% 400%;
-    animation: spaceGradient 15s ease infinite;
-}
 
-@keyframes spaceGradient {
-    0% { background-position: 0% 50%; }
-    50% { background-position: 100% 50%; }
-    100% { background-position: 0% 50%; }
-}
+@st.cache_resource
+def _get_db() -> DatabaseHandler:
+    """One DatabaseHandler per process, shared across reruns and sessions"""
+    return DatabaseHandler()
 
-/* Main Container with fun styling */
-.main .block-container {
-    padding: 2rem;
-    padding-bottom: 150px !important;
-    max-width: 1400px;
-    position: relative;
-    z-index: 1;
-}
 
-/* Make sure all content is visible */
-.main .block-container > div {
-    position: relative;
-    z-index: 2;
-}
+# Service factories import their modules on first call, so e.g. the login screen never loads openai or the agents
+@st.cache_resource
+def _get_openai_client():
+    from utils.openai_client import OpenAIClient
+    return OpenAIClient()
 
-/* Chat Messages - Fun bubbles! */
-.stChatMessage {
-    font-size: 16px !important;
-    line-height: 1.7 !important;
-    padding: 1.2rem !important;
-    border-radius: 20px !important;
-    margin: 0.8rem 0 !important;
-    animation: popIn 0.4s ease;
-    box-shadow: 0 6px 15px rgba(0,0,0,0.12);
-    position: relative;
-    z-index: 5;
-}
 
-@keyframes popIn {
-    0% { transform: scale(0.9) translateY(10px); opacity: 0; }
-    100% { transform: scale(1) translateY(0); opacity: 1; }
-}
+@st.cache_resource
+def _get_github_parser():
+    from content.github_parser import GitHubParser
+    return GitHubParser()
 
-/* Bot messages - Purple gradient with emoji */
-div[data-testid="stChatMessage-assistant"] {
-    background: linear-gradient(135deg, #e0c3fc 0%, #8ec5fc 100%) !important;
-    border-left: 5px solid #667eea !important;
-    border-top: 3px solid rgba(255,255,255,0.5);
-}
 
-/* User messages - Pink/Blue gradient */
-div[data-testid="stChatMessage-user"] {
-    background: linear-gradient(135deg, #ffeaa7 0%, #fab1a0 100%) !important;
-    border-left: 5px solid #fd79a8 !important;
-    border-top: 3px solid rgba(255,255,255,0.5);
-}
+@st.cache_resource
+def _get_prompt_manager():
+    from content.prompts import PromptManager
+    return PromptManager()
 
-/* Chat Input - Fun colorful border */
-.stChatInput textarea {
-    font-size: 18px !important;
-    border-radius: 25px !important;
-    border: 3px solid #48bb78 !important;
-    padding: 15px 20px !important;
-    min-height: 60px !important;
-    box-shadow: 0 4px 15px rgba(72, 187, 120, 0.3);
-    position: relative;
-    z-index: 10;
-}
 
-.stChatInput textarea:focus {
-    border-color: #667eea !important;
-    box-shadow: 0 4px 20px rgba(102, 126, 234, 0.5) !important;
-}
+@st.cache_resource
+def _get_response_cache():
+    from utils.response_cache import ResponseCache
+    return ResponseCache()
 
-/* Buttons - Fun and bouncy! */
-.stButton > button {
-    border-radius: 15px !important;
-    padding: 0.6rem 1.2rem !important;
-    font-weight: 600 !important;
-    background: linear-gradient(135deg, #667eea 0%, #764ba2 100%) !important;
-    color: white !important;
-    border: none !important;
-    box-shadow: 0 4px 15px rgba(102, 126, 234, 0.3);
-    transition: all 0.3s ease;
-}
 
-.stButton > button:hover {
-    transform: translateY(-3px) scale(1.05);
-    box-shadow: 0 6px 25px rgba(102, 126, 234, 0.5) !important;
-}
+@st.cache_resource
+def _get_content_pool():
+    from utils.content_pool import ContentPool
+    return ContentPool()
 
-/* Progress Bar - Animated rainbow! */
-.progress-container {
-    background: rgba(255, 255, 255, 0.95);
-    border-radius: 20px;
-    height: 36px;
-    margin: 1rem 0;
-    box-shadow: 0 4px 15px rgba(0,0,0,0.2);
-    border: 2px solid rgba(255,255,255,0.3);
-    position: relative;
-    overflow: visible;
-}
 
-.progress-fill {
-    background: linear-gradient(90deg, #667eea, #764ba2, #f093fb, #667eea);
-    background-size: 200%;
-    height: 100%;
-    border-radius: 18px;
-    animation: shimmer 3s linear infinite;
-    position: absolute;
-    top: 0;
-    left: 0;
-}
+@st.cache_resource
+def _get_socratic_tutor():
+    from agents.socratic_tutor import SocraticTutor
+    return SocraticTutor(_get_openai_client(), _get_prompt_manager(), _get_response_cache())
 
-/* Progress text overlay - always visible */
-.progress-container::after {
-    content: attr(data-progress);
-    position: absolute;
-    top: 50%;
-    left: 50%;
-    transform: translate(-50%, -50%);
-    color: #2c3e50;
-    font-weight: bold;
-    font-size: 0.95rem;
-    text-shadow: 1px 1px 2px rgba(255,255,255,0.8);
-    z-index: 2;
-    pointer-events: none;
-}
 
-@keyframes shimmer {
-    0% { background-position: 0%; }
-    100% { background-position: 200%; }
-}
+@st.cache_resource
+def _get_quiz_generator():
+    from agents.quiz_generator import QuizGenerator
+    return QuizGenerator(
+        _get_openai_client(), _get_prompt_manager(), _get_response_cache(), content_pool=_get_content_pool()
+    )
 
-/* Sidebar - Colorful Space Theme! */
-[data-testid="stSidebar"] {
-    background: linear-gradient(180deg, #667eea 0%, #764ba2 50%, #f093fb 100%) !important;
-    position: relative;
-    z-index: 100;
-    box-shadow: 4px 0 20px rgba(0,0,0,0.3);
-    border-right: 2px solid rgba(255,255,255,0.2);
-}
 
-[data-testid="stSidebar"] h1 {
-    font-size: 1.2rem !important;
-    font-weight: 700;
-    color: white !important;
-    text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-    margin-bottom: 0.5rem !important;
-    padding: 0.5rem 0 !important;
-}
+@st.cache_resource
+def _get_code_evaluator():
+    from agents.code_evaluator import CodeEvaluator
+    return CodeEvaluator(_get_openai_client(), _get_response_cache(), content_pool=_get_content_pool())
 
-[data-testid="stSidebar"] h3 {
-    font-size: 0.95rem !important;
-    font-weight: 600;
-    color: #ffeaa7 !important;
-    margin-top: 0.8rem !important;
-    margin-bottom: 0.4rem !important;
-    text-shadow: 1px 1px 2px rgba(0,0,0,0.2);
-    padding: 0.2rem 0 !important;
-    overflow: visible !important;
-    white-space: normal !important;
-}
 
-[data-testid="stSidebar"] .stButton > button {
-    font-size: 0.85rem !important;
-    padding: 0.4rem 0.7rem !important;
-    min-height: 35px !important;
-    margin: 0.2rem 0 !important;
-    background: rgba(255,255,255,0.2) !important;
-    color: white !important;
-    border: 1px solid rgba(255,255,255,0.3) !important;
-    transition: all 0.3s ease !important;
-}
+@st.cache_data(ttl="5m", max_entries=256)
+def _get_all_modules_cached(db_path: str) -> List[Dict]:
+    return _get_db().get_all_modules()
 
-[data-testid="stSidebar"] .stButton > button:hover {
-    background: rgba(255,255,255,0.3) !important;
-    transform: translateX(5px) !important;
-    border-color: rgba(255,255,255,0.5) !important;
-}
 
-[data-testid="stSidebar"] p {
-    font-size: 0.85rem !important;
-    margin: 0.25rem 0 !important;
-    color: rgba(255,255,255,0.95) !important;
-}
+@st.cache_data(ttl="30s")
+def _get_module_count_cached(db_path: str) -> int:
+    return _get_db().get_module_count()
 
-/* Sidebar selectbox - colorful */
-[data-testid="stSidebar"] .stSelectbox {
-    font-size: 0.85rem !important;
-}
 
-[data-testid="stSidebar"] .stSelectbox label {
-    font-size: 0.85rem !important;
-    margin-bottom: 0.2rem !important;
-    color: white !important;
-}
+def _clear_module_caches():
+    """Call after store_modules so the cached module list and count are reread"""
+    _get_all_modules_cached.clear()
+    _get_module_count_cached.clear()
 
-[data-testid="stSidebar"] .stSelectbox div[data-baseweb="select"] {
-    background: rgba(255,255,255,0.2) !important;
-    border-color: rgba(255,255,255,0.3) !important;
-}
 
-/* Compact markdown in sidebar */
-[data-testid="stSidebar"] .stMarkdown {
-    margin: 0.25rem 0 !important;
-    color: white !important;
-}
+@st.cache_data(ttl="5m", max_entries=256)
+def _get_user_progress_cached(db_path: str, user_id: str) -> List[Dict]:
+    return _get_db().get_user_progress(user_id)
 
-[data-testid="stSidebar"] hr {
-    margin: 0.6rem 0 !important;
-    border-color: rgba(255,255,255,0.3) !important;
-}
 
-/* Stats Cards - Colorful! */
-.stat-card {
-    background: rgba(255, 255, 255, 0.95);
-    border-radius: 20px;
-    padding: 1.5rem;
-    text-align: center;
-    box-shadow: 0 8px 20px rgba(0,0,0,0.15);
-    animation: floatUp 3s ease-in-out infinite;
-}
-
-@keyframes floatUp {
-    0%, 100% { transform: translateY(0); }
-    50% { transform: translateY(-10px); }
-}
+@st.cache_data(ttl="10m", max_entries=256)
+def _calc_streak_cached(db_path: str, user_id: str) -> int:
+    """Consecutive active days ending today, or yesterday if there's no activity yet today"""
+    active = {date.fromisoformat(day) for day in _get_db().get_activity_dates(user_id)}
+    day = date.today()
+    if day not in active:
+        day -= timedelta(days=1)
+    streak = 0
+    while day in active:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak
 
-.stat-value {
-    font-size: 2.5rem;
-    font-weight: bold;
-    background: linear-gradient(135deg, #667eea, #764ba2);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    background-clip: text;
-}
-
-/* Achievement Badges - Bouncy! */
-.achievement-badge {
-    display: inline-block;
-    background: linear-gradient(135deg, #f6ad55, #fc8181);
-    color: white;
-    padding: 0.6rem 1.2rem;
-    border-radius: 25px;
-    margin: 0.3rem;
-    font-weight: bold;
-    box-shadow: 0 4px 15px rgba(252, 129, 129, 0.4);
-    animation: bounce 2s infinite;
-}
 
-@keyframes bounce {
-    0%, 100% { transform: translateY(0); }
-    50% { transform: translateY(-10px); }
+# Title keyword -> flashcards / welcome message; the first keyword found in the lowercased title wins
+FLASHCARDS_BY_TOPIC = {
+    'introduction': [
+        {"question": "What is Python?", "answer": "Python is a friendly programming language that's perfect for beginners. It's used to build websites, games, apps, and even control robots!"},
+        {"question": "Why is Python good for beginners?", "answer": "Python code is easy to read and write - it's almost like writing in English! Plus it's used by companies like Google and NASA."},
+        {"question": "What can you build with Python?", "answer": "You can build websites, games, mobile apps, robots, and solve real-world problems! The possibilities are endless!"}
+    ],
+    'data types': [
+        {"question": "What is a string in Python?", "answer": "A string is text enclosed in quotes, like 'Hello' or \"Python\". It's how we store words and sentences!"},
+        {"question": "What is an integer?", "answer": "An integer is a whole number like 5, 10, or 100. No decimal points allowed!"},
+        {"question": "How do you create a variable?", "answer": "Just use: name = 'Alice' or age = 12. Variables are like labeled boxes to store information!"}
+    ],
+    'function': [
+        {"question": "What is a function?", "answer": "A function is like a recipe - it takes ingredients (inputs) and makes something (output). Use 'def' to create one!"},
+        {"question": "How do you call a function?", "answer": "Just write the function name with parentheses: greet() or add_numbers(5, 3)"},
+        {"question": "What does 'return' do?", "answer": "Return gives back a result from your function, like return x + y gives back the sum!"}
+    ],
 }
 
-/* Streak Badge - Fire animation! */
-.streak-badge {
-    display: inline-flex;
-    align-items: center;
-    background: linear-gradient(135deg, #fc8181 0%, #f6ad55 100%);
-    color: white;
-    padding: 0.8rem 1.5rem;
-    border-radius: 30px;
-    font-weight: bold;
-    font-size: 1.1rem;
-    box-shadow: 0 4px 20px rgba(252, 129, 129, 0.5);
-    animation: fireGlow 1.5s infinite;
-}
-
-@keyframes fireGlow {
-    0%, 100% { transform: scale(1); box-shadow: 0 4px 20px rgba(252, 129, 129, 0.5); }
-    50% { transform: scale(1.05); box-shadow: 0 6px 30px rgba(252, 129, 129, 0.8); }
-}
-
-/* XP Bar - Sparkling! */
-.xp-fill {
-    background: linear-gradient(90deg, #f6ad55, #fc8181, #f093fb);
-    background-size: 200%;
-    animation: sparkleMove 2s linear infinite;
-}
-
-@keyframes sparkleMove {
-    0% { background-position: 0%; }
-    100% { background-position: 200%; }
+WELCOME_MESSAGES = {
+    'introduction': "Welcome to your Python journey! I'm so excited to learn with you!\n\nPython is like having a magical language that lets you talk to computers! What would you like to explore first?",
+    'data types': "Time to explore the building blocks of Python - Data Types!\n\nThink of data types like different kinds of LEGO blocks - each one has a special purpose!\n\nWhat's your favorite thing? Is it a word, a number, or maybe something true/false?",
+    'data structures': "Welcome to Data Structures!\n\nImagine your backpack - you organize things in it, right? That's what data structures do!\n\nWhat do you like to collect or organize?",
+    'function': "Functions are here! These are like having superpowers!\n\nThink of functions like recipes - you give ingredients and get a result!\n\nWhat's your favorite recipe?",
+    'loops': "Ready for Loops? These let us repeat actions!\n\nLoops are like having a helpful robot that does repetitive tasks!\n\nWhat would YOU want a computer to repeat for you?",
+    'file': "File Handling time! Now we can save our work!\n\nThink of files like digital notebooks!\n\nWhat would you like to save in a file?"
 }
+# One pass over the title instead of a substring search per keyword; the leftmost keyword wins
+WELCOME_PATTERN = re.compile('|'.join(map(re.escape, WELCOME_MESSAGES)))
+
+
+@st.cache_data(max_entries=256)
+def _build_flashcards(module_title: str) -> List[Dict]:
+    """Flashcards for a module title; built once per title and shared by every session"""
+    title = module_title.lower()
+    return next(
+        (cards for key, cards in FLASHCARDS_BY_TOPIC.items() if key in title),
+        [
+            {"question": f"What do we learn in {module_title}?", "answer": f"In {module_title}, we explore important Python concepts that help us become better programmers!"},
+            {"question": "How do you print in Python?", "answer": "Use print('Hello World') - the print() function displays text on the screen!"},
+            {"question": "What makes Python special?", "answer": "Python is easy to read, powerful, and fun to use! It's perfect for learning programming."}
+        ]
+    )
+
+
+@st.cache_data(ttl="60s", max_entries=128)
+def _progress_summary(progress: Tuple[Tuple[int, bool, float], ...]) -> Dict:
+    """Completed count and average score over (module_id, completed, score) rows, in one pass"""
+    completed = score_sum = 0
+    for _, is_completed, score in progress:
+        completed += is_completed
+        score_sum += score
+    return {
+        'completed': completed,
+        'average_score': score_sum / len(progress) if progress else 0
+    }
 
-/* Success/Info/Warning Messages - Colorful! */
-.stSuccess {
-    background: linear-gradient(135deg, #b7f8db 0%, #50d890 100%) !important;
-    border-radius: 15px !important;
-    padding: 1rem !important;
-    border-left: 5px solid #27ae60 !important;
-    box-shadow: 0 4px 15px rgba(39, 174, 96, 0.3) !important;
-    animation: slideIn 0.4s ease !important;
-}
 
-.stInfo {
-    background: linear-gradient(135deg, #d4f1f4 0%, #75d7f0 100%) !important;
-    border-radius: 15px !important;
-    padding: 1rem !important;
-    border-left: 5px solid #3498db !important;
-    box-shadow: 0 4px 15px rgba(52, 152, 219, 0.3) !important;
-    animation: slideIn 0.4s ease !important;
-}
+def _minify_css(css: str) -> str:
+    """Strip comments and the whitespace around punctuation"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    css = re.sub(r'\s*([{};,>])\s*', r'\1', css)
+    return css.replace(': ', ':').replace(';}', '}').strip()
 
-.stWarning {
-    background: linear-gradient(135deg, #ffeaa7 0%, #fdcb6e 100%) !important;
-    border-radius: 15px !important;
-    padding: 1rem !important;
-    border-left: 5px solid #f39c12 !important;
-    box-shadow: 0 4px 15px rgba(243, 156, 18, 0.3) !important;
-    animation: slideIn 0.4s ease !important;
-}
 
-.stError {
-    background: linear-gradient(135deg, #fab1a0 0%, #ff7675 100%) !important;
-    border-radius: 15px !important;
-    padding: 1rem !important;
-    border-left: 5px solid #e74c3c !important;
-    box-shadow: 0 4px 15px rgba(231, 76, 60, 0.3) !important;
-    animation: slideIn 0.4s ease !important;
-}
+@st.cache_data
+def _get_css() -> str:
+    """Read and minify the stylesheet once per process; it still has to be sent on every rerun or Streamlit drops it"""
+    with open(STYLE_FILE, 'r', encoding='utf-8') as f:
+        return f"<style>{_minify_css(f.read())}</style>"
+# Page configuration
+st.set_page_config(
+    page_title="StudyBot - Learn Python with AI",
+    page_icon="🤖",
+    layout="wide",
+    initial_sidebar_state="auto",
+    menu_items={
+        'Get Help': 'https://www.python.org/',
+        'Report a bug': None,
+        'About': "StudyBot - Your Python Learning Buddy! 🐍✨"
+    }
+)
+# Fun, kid-friendly CSS design with animations!
+st.markdown(_get_css(), unsafe_allow_html=True)
 
-@keyframes slideIn {
-    0% { transform: translateX(-20px); opacity: 0; }
-    100% { transform: translateX(0); opacity: 1; }
-}
 
-/* Ensure notifications are visible */
-div[data-baseweb="notification"] {
-    background: rgba(255, 255, 255, 0.98) !important;
-    border-radius: 12px !important;
-    box-shadow: 0 4px 20px rgba(0,0,0,0.2) !important;
-}
 
-/* Mobile Responsive */
-@media (max-width: 768px) {
-    .main .block-container {
-        padding: 1rem !important;
-        padding-bottom: 180px !important;
-    }
-}
-</style>
-""", unsafe_allow_html=True)
 
 
 
+@dataclass(slots=True)
+class ParentalSettings:
+    """Parental control settings kept in session_state and saved as JSON"""
+    enabled: bool = False
+    pin: Optional[str] = None
+    daily_time_limit: int = 60
+    time_used_today: int = 0
+    last_reset: date = field(default_factory=date.today)
+    safe_mode: bool = True
+    difficulty_level: str = 'beginner'
+    allow_code_execution: bool = True
+    require_quiz_passing: bool = True
+    email_reports: bool = False
+    parent_email: Optional[str] = None
 
+    @classmethod
+    def from_dict(cls, data: Dict) -> 'ParentalSettings':
+        """Build from saved settings, ignoring unknown keys"""
+        settings = {k: v for k, v in data.items() if k in cls.__dataclass_fields__}
+        if isinstance(settings.get('last_reset'), str):
+            settings['last_reset'] = datetime.fromisoformat(settings['last_reset']).date()
+        return cls(**settings)
 
 
 class ParentalControlManager:
@@ -420,23 +269,11 @@ class ParentalControlManager:
                 st.session_state.parental_settings = saved_settings
             else:
                 # Create new settings
-                st.session_state.parental_settings = {
-                    'enabled': False,
-                    'pin': None,
-                    'daily_time_limit': 60,
-                    'time_used_today': 0,
-                    'last_reset': datetime.now().date().isoformat(),
-                    'safe_mode': True,
-                    'difficulty_level': 'beginner',
-                    'allow_code_execution': True,
-                    'require_quiz_passing': True,
-                    'email_reports': False,
-                    'parent_email': None
-                }
+                st.session_state.parental_settings = ParentalSettings()
     
     def save_parental_settings(self, user_id: str):
         """Save parental settings to database"""
-        settings = st.session_state.parental_settings
+        settings = asdict(st.session_state.parental_settings)
         settings_json = json.dumps(settings, default=str)
         
         try:
@@ -448,26 +285,19 @@ class ParentalControlManager:
             with open(f'.studybot_data/{user_id}_parental.json', 'w') as f:
                 json.dump(settings, f, default=str)
     
-    def load_parental_settings(self, user_id: str) -> Optional[Dict]:
+    def load_parental_settings(self, user_id: str) -> Optional[ParentalSettings]:
         """Load parental settings from database"""
         try:
             settings_json = self.db.get_user_settings(user_id, 'parental_settings')
             if settings_json:
-                settings = json.loads(settings_json)
-                # Convert date string back to date object if needed
-                if 'last_reset' in settings and isinstance(settings['last_reset'], str):
-                    settings['last_reset'] = datetime.fromisoformat(settings['last_reset']).date()
-                return settings
+                return ParentalSettings.from_dict(json.loads(settings_json))
         except (json.JSONDecodeError, ValueError) as e:
             print(f"Error loading parental settings from database: {e}")
         
         # Fallback to file if database fails
         try:
             with open(f'.studybot_data/{user_id}_parental.json', 'r') as f:
-                settings = json.load(f)
-                if 'last_reset' in settings and isinstance(settings['last_reset'], str):
-                    settings['last_reset'] = datetime.fromisoformat(settings['last_reset']).date()
-                return settings
+                return ParentalSettings.from_dict(json.load(f))
         except FileNotFoundError:
             pass
         
@@ -477,65 +307,64 @@ class ParentalControlManager:
         """Check if student has exceeded daily time limit"""
         settings = st.session_state.parental_settings
         
-        # Convert string to date if needed
-        if isinstance(settings['last_reset'], str):
-            settings['last_reset'] = datetime.fromisoformat(settings['last_reset']).date()
-        
         # Reset timer if it's a new day
-        if settings['last_reset'] != datetime.now().date():
-            settings['time_used_today'] = 0
-            settings['last_reset'] = datetime.now().date()
+        today = date.today()
+        if settings.last_reset != today:
+            settings.time_used_today = 0
+            settings.last_reset = today
             # SAVE TO DATABASE when resetting
             self.save_parental_settings(st.session_state.user_id)
         
-        time_remaining = settings['daily_time_limit'] - settings['time_used_today']
+        time_remaining = settings.daily_time_limit - settings.time_used_today
         
         return {
-            'allowed': time_remaining > 0 or not settings['enabled'],
+            'allowed': time_remaining > 0 or not settings.enabled,
             'time_remaining': time_remaining,
-            'time_used': settings['time_used_today'],
-            'limit': settings['daily_time_limit']
+            'time_used': settings.time_used_today,
+            'limit': settings.daily_time_limit
         }
     
     def increment_session_time(self, minutes: int = 1):
         """Increment time used in current session - UPDATED: Now saves to database"""
-        if st.session_state.parental_settings['enabled']:
-            st.session_state.parental_settings['time_used_today'] += minutes
+        if st.session_state.parental_settings.enabled:
+            st.session_state.parental_settings.time_used_today += minutes
             # SAVE TO DATABASE every time we increment
             self.save_parental_settings(st.session_state.user_id)
     
     def verify_parent_pin(self, pin: str) -> bool:
         """Verify parent PIN for accessing controls"""
-        return pin == st.session_state.parental_settings.get('pin')
+        return pin == st.session_state.parental_settings.pin
     
     def get_progress_report(self, user_id: str) -> Dict:
         """Generate progress report for parents"""
-        modules = self.db.get_all_modules()
-        user_progress = self.db.get_user_progress(user_id)
-        
-        completed = len([p for p in user_progress if p['completed']])
-        avg_score = sum([p.get('score', 0) for p in user_progress]) / len(user_progress) if user_progress else 0
+        modules = _get_all_modules_cached(self.db.db_path)
+        user_progress = _get_user_progress_cached(self.db.db_path, user_id)
+        summary = _progress_summary(tuple(
+            (p['module_id'], p['completed'], p['score'] or 0) for p in user_progress
+        ))
+        completed = summary['completed']
         
         return {
             'total_modules': len(modules),
             'completed_modules': completed,
             'completion_rate': (completed / len(modules) * 100) if modules else 0,
-            'average_score': avg_score,
-            'time_spent_today': st.session_state.parental_settings['time_used_today'],
+            'average_score': summary['average_score'],
+            'time_spent_today': st.session_state.parental_settings.time_used_today,
             'streak_days': self.calculate_streak(user_id),
             'last_activity': datetime.now()
         }
     
     def calculate_streak(self, user_id: str) -> int:
-        """Calculate learning streak in days"""
-        if 'streak' not in st.session_state:
-            st.session_state.streak = 1
+        """Calculate learning streak in days (today's visit always counts) and keep session_state.streak in sync"""
+        st.session_state.streak = max(_calc_streak_cached(self.db.db_path, user_id), 1)
         return st.session_state.streak
 
 
 class GamificationManager:
     """Manages XP, achievements, and gamification"""
     
+    XP_PER_LEVEL = 100
+    
     def __init__(self):
         self.initialize_gamification()
     
@@ -566,20 +395,17 @@ class GamificationManager:
         return new_level > old_level
     
     def calculate_level(self, xp: int) -> int:
-        """Calculate level from XP (100 XP per level)"""
-        return 1 + (xp // 100)
+        """Calculate level from XP (XP_PER_LEVEL XP per level)"""
+        return 1 + xp // self.XP_PER_LEVEL
     
     def get_xp_for_next_level(self) -> Dict:
         """Get XP needed for next level"""
-        current_level = st.session_state.level
-        xp_for_current = (current_level - 1) * 100
-        xp_for_next = current_level * 100
-        current_xp = st.session_state.xp
+        current = st.session_state.xp - (st.session_state.level - 1) * self.XP_PER_LEVEL
         
         return {
-            'current': current_xp - xp_for_current,
-            'needed': 100,
-            'percentage': ((current_xp - xp_for_current) / 100) * 100
+            'current': current,
+            'needed': self.XP_PER_LEVEL,
+            'percentage': current * 100 / self.XP_PER_LEVEL
         }
     
     def check_achievements(self, achievement_type: str, value: any):
@@ -618,28 +444,38 @@ class GamificationManager:
             st.info("Start learning to unlock achievements!")
             return
         
-        cols = st.columns(3)
-        for idx, achievement in enumerate(st.session_state.achievements):
-            with cols[idx % 3]:
-                st.markdown(f'<div class="achievement-badge">{achievement.replace("_", " ").title()}</div>', 
-                          unsafe_allow_html=True)
+        badges = "".join(
+            f'<div class="achievement-badge">{achievement.replace("_", " ").title()}</div>'
+            for achievement in st.session_state.achievements
+        )
+        st.markdown(f'<div class="achievements-grid">{badges}</div>', unsafe_allow_html=True)
 
 
 class EnhancedStudyBotApp:
     def __init__(self):
-        self.db = DatabaseHandler()
+        self.db = _get_db()
         self.auth = AuthHandler()  # NEW: Add auth handler
-        self.github_parser = GitHubParser()
-        self.prompt_manager = PromptManager()
-        self.openai_client = OpenAIClient()
-        self.socratic_tutor = SocraticTutor(self.openai_client, self.prompt_manager)
-        self.quiz_generator = QuizGenerator(self.openai_client, self.prompt_manager)
-        self.code_evaluator = CodeEvaluator(self.openai_client)
-        
         self.parental_control = ParentalControlManager(self.db)
         self.gamification = GamificationManager()
         
         self.init_session_state()
+    
+    # Shared, stateless-per-user services; each is built (and its module imported) on first use
+    @property
+    def github_parser(self):
+        return _get_github_parser()
+    
+    @property
+    def socratic_tutor(self):
+        return _get_socratic_tutor()
+    
+    @property
+    def quiz_generator(self):
+        return _get_quiz_generator()
+    
+    @property
+    def code_evaluator(self):
+        return _get_code_evaluator()
         
     def init_session_state(self):
         """Initialize all session state variables"""
@@ -656,9 +492,9 @@ class EnhancedStudyBotApp:
                     st.session_state.user_id, 
                     st.session_state.current_module
                 )
-                st.session_state.chat_history = saved_history if saved_history else []
+                st.session_state.chat_history = new_chat_history(saved_history or ())
             else:
-                st.session_state.chat_history = []  
+                st.session_state.chat_history = new_chat_history()
             
         if 'learning_mode' not in st.session_state:
             st.session_state.learning_mode = 'socratic'
@@ -680,6 +516,7 @@ class EnhancedStudyBotApp:
         
         self.parental_control.initialize_parental_settings(st.session_state.user_id)
         self.gamification.initialize_gamification()
+        self.parental_control.calculate_streak(st.session_state.user_id)
     
     def render_header(self):
         """Render fun, compact header for kids!"""
@@ -711,23 +548,31 @@ class EnhancedStudyBotApp:
             </div>
         </div>
         """, unsafe_allow_html=True)
+
+    def keep_module_choice_unlocked(self, unlocked: set):
+        """Module radio callback: put the selection back if a locked module was picked"""
+        if st.session_state.module_choice not in unlocked:
+            st.session_state.module_choice = st.session_state.current_module
+            st.toast("🔒 Pass the previous module's quiz to unlock this one!")
+
     def render_parent_control_button(self):
         """Render parent control access button"""
-        if st.sidebar.button("👨‍👩‍👧 Parent Dashboard", key="parent_btn"):
+        if st.button("👨‍👩‍👧 Parent Dashboard", key="parent_btn"):
             st.session_state.show_parent_panel = not st.session_state.show_parent_panel
             st.rerun()
     
+    @st.fragment
     def render_parental_dashboard(self):
         """Render parental control dashboard - FIX: Now saves PIN"""
         st.markdown('<div class="parent-panel">', unsafe_allow_html=True)
         st.markdown("### 👨‍👩‍👧 Parental Control Dashboard")
         
-        if not st.session_state.parental_settings.get('pin'):
+        if not st.session_state.parental_settings.pin:
             st.info("Set up parental controls with a 4-digit PIN")
             pin = st.text_input("Create PIN:", type="password", max_chars=4, key="setup_pin")
             if st.button("Set PIN") and len(pin) == 4:
-                st.session_state.parental_settings['pin'] = pin
-                st.session_state.parental_settings['enabled'] = True
+                st.session_state.parental_settings.pin = pin
+                st.session_state.parental_settings.enabled = True
                 # SAVE TO DATABASE
                 self.parental_control.save_parental_settings(st.session_state.user_id)
                 st.success("✅ Parental controls activated and saved!")
@@ -748,92 +593,51 @@ class EnhancedStudyBotApp:
             
             st.markdown("#### ⚙️ Settings")
             
-            col1, col2 = st.columns(2)
+            settings = st.session_state.parental_settings
             
-            with col1:
-                new_limit = st.slider(
-                    "Daily Time Limit (minutes):",
-                    15, 180, 
-                    st.session_state.parental_settings['daily_time_limit'],
-                    step=15
-                )
-                if new_limit != st.session_state.parental_settings['daily_time_limit']:
-                    st.session_state.parental_settings['daily_time_limit'] = new_limit
-                    self.parental_control.save_parental_settings(st.session_state.user_id)
+            # A form so adjusting several controls costs one rerun and one save, on submit
+            with st.form("parent_settings"):
+                col1, col2 = st.columns(2)
                 
-                new_safe_mode = st.checkbox(
-                    "Safe Mode (Age-appropriate content)",
-                    st.session_state.parental_settings['safe_mode']
-                )
-                if new_safe_mode != st.session_state.parental_settings['safe_mode']:
-                    st.session_state.parental_settings['safe_mode'] = new_safe_mode
-                    self.parental_control.save_parental_settings(st.session_state.user_id)
+                with col1:
+                    new_limit = st.slider(
+                        "Daily Time Limit (minutes):",
+                        15, 180, 
+                        settings.daily_time_limit,
+                        step=15
+                    )
+                    new_safe_mode = st.checkbox(
+                        "Safe Mode (Age-appropriate content)",
+                        settings.safe_mode
+                    )
+                    new_code_exec = st.checkbox(
+                        "Allow Code Execution",
+                        settings.allow_code_execution
+                    )
                 
-                new_code_exec = st.checkbox(
-                    "Allow Code Execution",
-                    st.session_state.parental_settings['allow_code_execution']
-                )
-                if new_code_exec != st.session_state.parental_settings['allow_code_execution']:
-                    st.session_state.parental_settings['allow_code_execution'] = new_code_exec
-                    self.parental_control.save_parental_settings(st.session_state.user_id)
-            
-            with col2:
-                new_difficulty = st.selectbox(
-                    "Difficulty Level:",
-                    ['beginner', 'intermediate', 'advanced'],
-                    index=['beginner', 'intermediate', 'advanced'].index(
-                        st.session_state.parental_settings['difficulty_level']
+                with col2:
+                    new_difficulty = st.selectbox(
+                        "Difficulty Level:",
+                        DIFFICULTY_LEVELS,
+                        index=DIFFICULTY_LEVELS.index(settings.difficulty_level)
+                    )
+                    new_quiz_passing = st.checkbox(
+                        "Require 80% to advance",
+                        settings.require_quiz_passing
                     )
-                )
-                if new_difficulty != st.session_state.parental_settings['difficulty_level']:
-                    st.session_state.parental_settings['difficulty_level'] = new_difficulty
-                    self.parental_control.save_parental_settings(st.session_state.user_id)
                 
-                new_quiz_passing = st.checkbox(
-                    "Require 80% to advance",
-                    st.session_state.parental_settings['require_quiz_passing']
-                )
-                if new_quiz_passing != st.session_state.parental_settings['require_quiz_passing']:
-                    st.session_state.parental_settings['require_quiz_passing'] = new_quiz_passing
+                if st.form_submit_button("💾 Save Settings"):
+                    settings.daily_time_limit = new_limit
+                    settings.safe_mode = new_safe_mode
+                    settings.allow_code_execution = new_code_exec
+                    settings.difficulty_level = new_difficulty
+                    settings.require_quiz_passing = new_quiz_passing
                     self.parental_control.save_parental_settings(st.session_state.user_id)
+                    st.success("✅ Settings saved!")
             
             # Progress Report
             st.markdown("#### 📊 Progress Report")
-            report = self.parental_control.get_progress_report(st.session_state.user_id)
-            
-            stat_col1, stat_col2, stat_col3, stat_col4 = st.columns(4)
-            
-            with stat_col1:
-                st.markdown(f"""
-                <div class="stat-card">
-                    <div class="stat-value">{report['completed_modules']}</div>
-                    <div class="stat-label">Completed Modules</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with stat_col2:
-                st.markdown(f"""
-                <div class="stat-card">
-                    <div class="stat-value">{report['completion_rate']:.0f}%</div>
-                    <div class="stat-label">Completion Rate</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with stat_col3:
-                st.markdown(f"""
-                <div class="stat-card">
-                    <div class="stat-value">{report['time_spent_today']}</div>
-                    <div class="stat-label">Minutes Today</div>
-                </div>
-                """, unsafe_allow_html=True)
-            
-            with stat_col4:
-                st.markdown(f"""
-                <div class="stat-card">
-                    <div class="stat-value">{report['streak_days']}</div>
-                    <div class="stat-label">Day Streak</div>
-                </div>
-                """, unsafe_allow_html=True)
+            self.render_progress_stats()
             
             # Quick Actions
             st.markdown("#### 🎯 Quick Actions")
@@ -845,7 +649,7 @@ class EnhancedStudyBotApp:
             
             with action_col2:
                 if st.button("🔄 Reset Daily Timer"):
-                    st.session_state.parental_settings['time_used_today'] = 0
+                    st.session_state.parental_settings.time_used_today = 0
                     self.parental_control.save_parental_settings(st.session_state.user_id)
                     st.success("Timer reset!")
         
@@ -856,6 +660,17 @@ class EnhancedStudyBotApp:
             st.session_state.pin_verified = False
             st.rerun()
     
+    def render_progress_stats(self):
+        """Render the progress report stat cards"""
+        report = self.parental_control.get_progress_report(st.session_state.user_id)
+        cards = "".join(STAT_CARD_HTML.format(value=value, label=label) for value, label in (
+            (report['completed_modules'], "Completed Modules"),
+            (f"{report['completion_rate']:.0f}%", "Completion Rate"),
+            (report['time_spent_today'], "Minutes Today"),
+            (report['streak_days'], "Day Streak"),
+        ))
+        st.markdown(f'<div class="stats-grid">{cards}</div>', unsafe_allow_html=True)
+    
     def check_time_limit_warning(self):
         """Check and display time limit warnings"""
         time_status = self.parental_control.check_time_limit()
@@ -874,92 +689,108 @@ class EnhancedStudyBotApp:
     
     def load_modules(self):
         """Load and cache modules from GitHub"""
-        if not st.session_state.modules_loaded:
-            with st.spinner("🚀 Loading Python lessons... This might take a moment!"):
+        if st.session_state.modules_loaded:
+            return True
+        
+        with st.spinner("🚀 Loading Python lessons... This might take a moment!"):
+            try:
+                if _get_module_count_cached(self.db.db_path) >= 6:
+                    st.session_state.modules_loaded = True
+                    st.success("✅ Lessons loaded successfully!")
+                    return True
+                
                 try:
-                    existing_modules = self.db.get_all_modules()
-                    if len(existing_modules) >= 6:
-                        st.session_state.modules_loaded = True
-                        st.success("✅ Lessons loaded successfully!")
-                        return True
-                    
-                    try:
-                        modules = self.github_parser.parse_repository()
-                        if len(modules) < 3:
-                            modules = self.github_parser.create_fallback_modules()
-                    except:
+                    modules = self.github_parser.parse_repository()
+                    if len(modules) < 3:
                         modules = self.github_parser.create_fallback_modules()
-                    
-                    self.db.store_modules(modules)
-                    st.session_state.modules_loaded = True
-                    st.success(f"✅ {len(modules)} lessons loaded successfully!")
-                except Exception as e:
-                    st.error(f"❌ Error loading lessons: {str(e)}")
-                    return False
+                except:
+                    modules = self.github_parser.create_fallback_modules()
+                
+                self.db.store_modules(modules)
+                _clear_module_caches()
+                st.session_state.modules_loaded = True
+                st.success(f"✅ {len(modules)} lessons loaded successfully!")
+            except Exception as e:
+                st.error(f"❌ Error loading lessons: {str(e)}")
+                return False
         return True
     
+    @st.fragment
     def render_sidebar(self):
-        """Render enhanced sidebar with progress and controls"""
-        st.sidebar.title("📚 Learning Dashboard")
+        """Render enhanced sidebar with progress and controls (call inside `with st.sidebar:`)"""
+        st.title("📚 Learning Dashboard")
         
         self.render_parent_control_button()
         
-        if st.sidebar.button("🏆 View Achievements"):
-            with st.sidebar:
-                self.gamification.display_achievements()
+        if st.button("🏆 View Achievements"):
+            self.gamification.display_achievements()
         
-        st.sidebar.markdown("---")
+        st.markdown("---")
         
-        modules = self.db.get_all_modules()
-        user_progress = self.db.get_user_progress(st.session_state.user_id)
+        modules = _get_all_modules_cached(self.db.db_path)
+        user_progress = _get_user_progress_cached(self.db.db_path, st.session_state.user_id)
         
         if modules:
-            completed_modules = len([p for p in user_progress if p['completed']])
+            completed_ids = {p['module_id'] for p in user_progress if p['completed']}
+            completed_modules = len(completed_ids)
             total_modules = len(modules)
             progress_percentage = (completed_modules / total_modules) * 100 if total_modules > 0 else 0
             
-            st.sidebar.markdown("### 📊 Your Progress")
-            st.sidebar.markdown(f"""
+            st.markdown("### 📊 Your Progress")
+            st.markdown(f"""
             <div class="progress-container" data-progress="{completed_modules}/{total_modules} Complete">
                 <div class="progress-fill" style="width: {progress_percentage}%;"></div>
             </div>
             """, unsafe_allow_html=True)
             
-            st.sidebar.markdown("### 📖 Available Modules")
+            st.markdown("### 📖 Available Modules")
+            # One radio lists every module in course order; picking a locked one is undone by its callback
+            labels = {}
+            unlocked = set()
             for i, module in enumerate(modules):
                 is_basic_module = i <= 2
-                is_progression_unlocked = any(p['module_id'] == modules[i-1]['id'] and p['completed'] for p in user_progress) if i > 0 else True
+                is_progression_unlocked = modules[i-1]['id'] in completed_ids if i > 0 else True
                 is_unlocked = is_basic_module or is_progression_unlocked
                 
-                is_completed = any(p['module_id'] == module['id'] and p['completed'] for p in user_progress)
-                
-                status = "✅" if is_completed else "🔓" if is_unlocked else "🔒"
+                if is_unlocked:
+                    unlocked.add(i)
+                    status = "✅" if module['id'] in completed_ids else "🔓"
+                else:
+                    status = "🔒"
+                labels[i] = f"{status} {module['title']}"
+            
+            current = st.session_state.current_module
+            if 'module_choice' not in st.session_state:
+                st.session_state.module_choice = current
+            selected = st.radio(
+                "Modules",
+                list(labels),
+                format_func=labels.get,
+                key="module_choice",
+                on_change=self.keep_module_choice_unlocked,
+                args=(unlocked,),
+                label_visibility="collapsed"
+            )
+            
+            if selected is not None and selected != current:
+                module = modules[selected]
+                if st.session_state.chat_history and current is not None:
+                    self.save_current_chat_history(modules[current]['id'])
                 
-                if st.sidebar.button(f"{status} {module['title']}", key=f"module_{i}", disabled=not is_unlocked):
-                    if st.session_state.chat_history and st.session_state.current_module is not None:
-                        current_mod = modules[st.session_state.current_module]
-                        self.save_current_chat_history(current_mod['id'])
-                    
-                    st.session_state.current_module = i
-                    st.session_state.chat_loaded = False
-                    self.load_chat_history_for_module(module['id'])
-                    st.session_state.first_visit = len(st.session_state.chat_history) == 0
-                    if st.session_state.first_visit:
-                        self.add_module_welcome_message(module)
-                    st.rerun()
+                st.session_state.current_module = selected
+                st.session_state.chat_loaded = False
+                self.load_chat_history_for_module(module['id'])
+                st.session_state.first_visit = len(st.session_state.chat_history) == 0
+                if st.session_state.first_visit:
+                    self.add_module_welcome_message(module)
+                st.rerun()
 
-        st.sidebar.markdown("### 🎯 Learning Mode")
-        new_mode = st.sidebar.selectbox(
+        st.markdown("### 🎯 Learning Mode")
+        new_mode = st.selectbox(
             "Choose your learning style:",
-            ['socratic', 'flashcards', 'quiz', 'explanation', 'coding'],
-            format_func=lambda x: {
-                'socratic': '🤔 Socratic Method',
-                'flashcards': '📚 Flashcards',
-                'quiz': '🧪 Quiz Mode',
-                'explanation': '💡 Explain Topics',
-                'coding': '💻 Code Practice'
-            }[x],
-            index=['socratic', 'flashcards', 'quiz', 'explanation', 'coding'].index(st.session_state.learning_mode)
+            LEARNING_MODES,
+            format_func=LEARNING_MODE_LABELS.__getitem__,
+            index=LEARNING_MODES.index(st.session_state.learning_mode)
         )
         
         if new_mode != st.session_state.learning_mode:
@@ -967,51 +798,51 @@ class EnhancedStudyBotApp:
             st.session_state.quiz_active = False
             st.rerun()
 
-        if st.sidebar.button("🔄 Start Fresh Chat"):
-            if modules and st.session_state.current_module < len(modules):
-                current_mod = modules[st.session_state.current_module]
+        if st.button("🔄 Start Fresh Chat"):
+            current_mod = st.session_state.current_module_obj
+            if current_mod:
                 self.db.clear_chat_history(st.session_state.user_id, current_mod['id'])
-            st.session_state.chat_history = []
+                st.session_state.get('chat_cache', {}).pop(current_mod['id'], None)
+            st.session_state.chat_history = new_chat_history()
             st.session_state.quiz_active = False
             st.rerun()
             
-        st.sidebar.markdown("---")
-        st.sidebar.markdown("**🛠️ Developer Tools**")
+        st.markdown("---")
+        st.markdown("**🛠️ Developer Tools**")
         
-        if st.sidebar.button("🔧 Reload All Modules"):
+        if st.button("🔧 Reload All Modules"):
             st.session_state.modules_loaded = False
             try:
                 modules = self.github_parser.create_fallback_modules()
                 self.db.store_modules(modules)
+                _clear_module_caches()
                 st.session_state.modules_loaded = True
-                st.sidebar.success(f"✅ Reloaded {len(modules)} modules!")
+                st.success(f"✅ Reloaded {len(modules)} modules!")
                 st.rerun()
             except Exception as e:
-                st.sidebar.error(f"❌ Error: {str(e)}")
+                st.error(f"❌ Error: {str(e)}")
         
-        if st.sidebar.button("🔓 Unlock All Modules"):
+        if st.button("🔓 Unlock All Modules"):
             try:
-                modules = self.db.get_all_modules()
-                for module in modules:
-                    self.db.update_user_progress(
-                        st.session_state.user_id, 
-                        module['id'], 
-                        completed=True, 
-                        score=100
-                    )
-                st.sidebar.success("🔓 All modules unlocked!")
+                modules = _get_all_modules_cached(self.db.db_path)
+                self.db.update_user_progress_many(
+                    st.session_state.user_id, 
+                    [module['id'] for module in modules], 
+                    completed=True, 
+                    score=100
+                )
+                _get_user_progress_cached.clear()
+                st.success("🔓 All modules unlocked!")
                 st.rerun()
             except Exception as e:
-                st.sidebar.error(f"❌ Error: {str(e)}")
+                st.error(f"❌ Error: {str(e)}")
 
     def render_chat_interface(self):
         """Render the main chat interface"""
-        modules = self.db.get_all_modules()
-        if not modules:
+        current_module = st.session_state.current_module_obj
+        if not current_module:
             st.warning("⚠️ No modules loaded. Please wait for the content to load.")
             return
-
-        current_module = modules[st.session_state.current_module]
         
         st.markdown(f"### 📖 Current Module: {current_module['title']}")
         
@@ -1026,15 +857,20 @@ class EnhancedStudyBotApp:
             self.add_module_welcome_message(current_module)
             st.session_state.first_visit = False
         
+        # Only the newest messages are sent each rerun; older ones a page at a time on request
+        history = st.session_state.chat_history
+        window = st.session_state.get('chat_window', CHAT_VISIBLE_MESSAGES)
+        hidden = max(len(history) - window, 0)
         chat_container = st.container()
         with chat_container:
-            for message in st.session_state.chat_history:
-                if message['role'] == 'assistant':
-                    with st.chat_message("assistant", avatar="🤖"):
-                        st.markdown(message['content'])
-                else:
-                    with st.chat_message("user", avatar="👦"):
-                        st.markdown(message['content'])
+            if hidden:
+                st.caption(f"[{hidden} earlier messages hidden]")
+                if st.button("⬆️ Load earlier", key="load_earlier_chat"):
+                    st.session_state.chat_window = window + CHAT_VISIBLE_MESSAGES
+                    st.rerun()
+            for message in itertools.islice(history, hidden, None):
+                role = 'assistant' if message['role'] == 'assistant' else 'user'
+                st.chat_message(role, avatar=CHAT_AVATARS[role]).markdown(message['content'])
 
         if st.session_state.learning_mode == 'quiz' and not st.session_state.quiz_active:
             if st.button("🧪 Start Module Quiz", type="primary"):
@@ -1060,24 +896,20 @@ class EnhancedStudyBotApp:
                 'content': prompt
             })
             
-            self.db.save_chat_message(
-                st.session_state.user_id,
-                current_module['id'],
-                'user',
-                prompt,
-                st.session_state.learning_mode
-            )
-            
-            with st.chat_message("assistant", avatar="🤖"):
-                with st.spinner("Thinking..."):
-                    if st.session_state.learning_mode == 'socratic':
-                        response = self.socratic_tutor.respond(prompt, current_module, st.session_state.chat_history)
-                    elif st.session_state.learning_mode == 'explanation':
+            with st.chat_message("assistant", avatar=CHAT_AVATARS["assistant"]):
+                if st.session_state.learning_mode == 'explanation':
+                    with st.spinner("Thinking..."):
                         response = self.socratic_tutor.explain_topic(prompt, current_module)
-                    else:
-                        response = self.socratic_tutor.respond(prompt, current_module, st.session_state.chat_history)
+                    if response:
+                        st.markdown(response)
+                else:
+                    # Shown as it arrives, so the wait is only until the first chunk
+                    response = st.write_stream(
+                        self.socratic_tutor.respond_stream(prompt, current_module, st.session_state.chat_history)
+                    ).strip()
                 
-                st.markdown(response or "Sorry, I couldn't generate a response.")
+                if not response:
+                    st.markdown("Sorry, I couldn't generate a response.")
             
             response_content = response or "Sorry, I couldn't generate a response."
             st.session_state.chat_history.append({
@@ -1085,11 +917,11 @@ class EnhancedStudyBotApp:
                 'content': response_content
             })
             
-            self.db.save_chat_message(
+            # Both turns go to the database in one transaction
+            self.db.save_chat_messages(
                 st.session_state.user_id,
                 current_module['id'],
-                'assistant',
-                response_content,
+                [('user', prompt), ('assistant', response_content)],
                 st.session_state.learning_mode
             )
             
@@ -1099,7 +931,7 @@ class EnhancedStudyBotApp:
         """Render coding practice interface"""
         st.markdown("### 💻 Code Practice")
         
-        if not st.session_state.parental_settings['allow_code_execution']:
+        if not st.session_state.parental_settings.allow_code_execution:
             st.warning("⚠️ Code execution is disabled by parental controls.")
             return
         
@@ -1115,25 +947,24 @@ class EnhancedStudyBotApp:
         with col1:
             if st.button("🏃‍♂️ Run Code"):
                 if user_code.strip():
-                    result = self.code_evaluator.evaluate_code(user_code, st.session_state.coding_exercise)
                     st.markdown("**Result:**")
-                    st.code(result, language="python")
+                    st.write_stream(
+                        self.code_evaluator.evaluate_code_stream(user_code, st.session_state.coding_exercise)
+                    )
                     self.gamification.award_xp(15, "Completed coding exercise")
                     
         with col2:
-            if st.button("🔄 New Exercise"):
-                del st.session_state.coding_exercise
-                st.rerun()
+            st.button("🔄 New Exercise", on_click=st.session_state.pop, args=('coding_exercise', None))
 
     def render_flashcard_interface(self, current_module):
         """Render flashcard interface"""
         st.markdown("### 📚 Flashcards")
         
-        if 'flashcard_data' not in st.session_state:
-            with st.spinner("Generating flashcards..."):
-                st.session_state.flashcard_data = self.generate_flashcards(current_module)
-                st.session_state.flashcard_index = 0
-                st.session_state.show_answer = False
+        if st.session_state.get('flashcard_module') != current_module['id']:
+            st.session_state.flashcard_data = self.generate_flashcards(current_module)
+            st.session_state.flashcard_module = current_module['id']
+            st.session_state.flashcard_index = 0
+            st.session_state.show_answer = False
         
         if st.session_state.flashcard_data:
             total_cards = len(st.session_state.flashcard_data)
@@ -1144,106 +975,75 @@ class EnhancedStudyBotApp:
             st.markdown(f"### {current_card['question']}")
             
             if not st.session_state.show_answer:
-                if st.button("🔍 Show Answer"):
-                    st.session_state.show_answer = True
-                    st.rerun()
+                st.button("🔍 Show Answer", on_click=self.show_flashcard_answer)
             else:
                 st.success(f"**Answer:** {current_card['answer']}")
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
-                    if st.button("👍 Got it!"):
-                        self.gamification.award_xp(3, "Reviewed flashcard")
-                        self.next_flashcard()
+                    st.button("👍 Got it!", on_click=self.next_flashcard, args=(3,))
                 with col2:
-                    if st.button("👎 Need review"):
-                        self.next_flashcard()
+                    st.button("👎 Need review", on_click=self.next_flashcard)
                 with col3:
-                    if st.button("➡️ Next"):
-                        self.next_flashcard()
+                    st.button("➡️ Next", on_click=self.next_flashcard)
 
     def generate_flashcards(self, module):
         """Generate flashcards for the current module"""
-        module_title = module.get('title', 'Python')
-        
-        flashcards = []
-        
-        if 'introduction' in module_title.lower():
-            flashcards = [
-                {"question": "What is Python?", "answer": "Python is a friendly programming language that's perfect for beginners. It's used to build websites, games, apps, and even control robots!"},
-                {"question": "Why is Python good for beginners?", "answer": "Python code is easy to read and write - it's almost like writing in English! Plus it's used by companies like Google and NASA."},
-                {"question": "What can you build with Python?", "answer": "You can build websites, games, mobile apps, robots, and solve real-world problems! The possibilities are endless!"}
-            ]
-        elif 'data types' in module_title.lower():
-            flashcards = [
-                {"question": "What is a string in Python?", "answer": "A string is text enclosed in quotes, like 'Hello' or \"Python\". It's how we store words and sentences!"},
-                {"question": "What is an integer?", "answer": "An integer is a whole number like 5, 10, or 100. No decimal points allowed!"},
-                {"question": "How do you create a variable?", "answer": "Just use: name = 'Alice' or age = 12. Variables are like labeled boxes to store information!"}
-            ]
-        elif 'function' in module_title.lower():
-            flashcards = [
-                {"question": "What is a function?", "answer": "A function is like a recipe - it takes ingredients (inputs) and makes something (output). Use 'def' to create one!"},
-                {"question": "How do you call a function?", "answer": "Just write the function name with parentheses: greet() or add_numbers(5, 3)"},
-                {"question": "What does 'return' do?", "answer": "Return gives back a result from your function, like return x + y gives back the sum!"}
-            ]
-        else:
-            flashcards = [
-                {"question": f"What do we learn in {module_title}?", "answer": f"In {module_title}, we explore important Python concepts that help us become better programmers!"},
-                {"question": "How do you print in Python?", "answer": "Use print('Hello World') - the print() function displays text on the screen!"},
-                {"question": "What makes Python special?", "answer": "Python is easy to read, powerful, and fun to use! It's perfect for learning programming."}
-            ]
-        
-        return flashcards
+        return _build_flashcards(module.get('title', 'Python'))
 
     def save_current_chat_history(self, module_id: int):
         """Save current chat history to database"""
         pass
     
     def load_chat_history_for_module(self, module_id: int):
-        """Load chat history for a specific module"""
+        """Load chat history for a specific module, from the database only on the first visit this session"""
+        st.session_state.chat_window = CHAT_VISIBLE_MESSAGES
+        # Module id -> that module's chat_history deque; new messages are appended to it in place
+        chat_cache = st.session_state.setdefault('chat_cache', {})
+        if module_id in chat_cache:
+            st.session_state.chat_history = chat_cache[module_id]
+            return
         try:
             chat_history = self.db.load_chat_history(st.session_state.user_id, module_id)
-            st.session_state.chat_history = [
+            st.session_state.chat_history = chat_cache[module_id] = new_chat_history(
                 {'role': msg['role'], 'content': msg['content']} 
                 for msg in chat_history
-            ]
+            )
         except Exception as e:
             st.error(f"Error loading chat history: {str(e)}")
-            st.session_state.chat_history = []
+            st.session_state.chat_history = new_chat_history()
     
     def add_module_welcome_message(self, module):
         """Add welcome message when entering a new module"""
         module_title = module.get('title', 'Python Learning')
         
-        welcome_messages = {
-            'introduction': "Welcome to your Python journey! I'm so excited to learn with you!\n\nPython is like having a magical language that lets you talk to computers! What would you like to explore first?",
-            'data types': "Time to explore the building blocks of Python - Data Types!\n\nThink of data types like different kinds of LEGO blocks - each one has a special purpose!\n\nWhat's your favorite thing? Is it a word, a number, or maybe something true/false?",
-            'data structures': "Welcome to Data Structures!\n\nImagine your backpack - you organize things in it, right? That's what data structures do!\n\nWhat do you like to collect or organize?",
-            'function': "Functions are here! These are like having superpowers!\n\nThink of functions like recipes - you give ingredients and get a result!\n\nWhat's your favorite recipe?",
-            'loops': "Ready for Loops? These let us repeat actions!\n\nLoops are like having a helpful robot that does repetitive tasks!\n\nWhat would YOU want a computer to repeat for you?",
-            'file': "File Handling time! Now we can save our work!\n\nThink of files like digital notebooks!\n\nWhat would you like to save in a file?"
-        }
-        
-        welcome_msg = next(
-            (msg for key, msg in welcome_messages.items() if key in module_title.lower()),
-            f"Welcome to {module_title}!\n\nI'm excited to explore this topic with you!\n\nWhat questions do you have?"
-        )
+        match = WELCOME_PATTERN.search(module_title.lower())
+        if match:
+            welcome_msg = WELCOME_MESSAGES[match.group(0)]
+        else:
+            welcome_msg = f"Welcome to {module_title}!\n\nI'm excited to explore this topic with you!\n\nWhat questions do you have?"
         
         st.session_state.chat_history.append({
             'role': 'assistant',
             'content': welcome_msg
         })
 
-    def next_flashcard(self):
-        """Move to next flashcard"""
+    # Flashcard buttons use these as on_click callbacks, which run before the rerun the click
+    # triggers, so the new card state is drawn in that same run instead of needing a second one
+    def show_flashcard_answer(self):
+        """Reveal the answer on the current flashcard"""
+        st.session_state.show_answer = True
+
+    def next_flashcard(self, xp: int = 0):
+        """Move to next flashcard, awarding xp for the reviewed one"""
+        if xp:
+            self.gamification.award_xp(xp, "Reviewed flashcard")
         st.session_state.flashcard_index = (st.session_state.flashcard_index + 1) % len(st.session_state.flashcard_data)
         st.session_state.show_answer = False
-        st.rerun()
 
     def start_quiz(self, module):
         """Start a quiz for the current module"""
         with st.spinner("🎯 Creating your personalized quiz..."):
-            user_progress = self.db.get_user_progress(st.session_state.user_id)
             difficult_topics = self.db.get_difficult_topics(st.session_state.user_id, module['id'])
             
             quiz_data = self.quiz_generator.generate_quiz(module, difficult_topics)
@@ -1252,9 +1052,8 @@ class EnhancedStudyBotApp:
             st.session_state.current_question = 0
             st.session_state.user_answers = []
             
-            for i in range(10):
-                if f'quiz_answer_{i}' in st.session_state:
-                    del st.session_state[f'quiz_answer_{i}']
+            for key in [k for k in st.session_state if k.startswith(QUIZ_STATE_PREFIXES)]:
+                del st.session_state[key]
             
             st.rerun()
     def save_chat_message_to_db(self, role: str, content: str):
@@ -1275,7 +1074,7 @@ class EnhancedStudyBotApp:
                 st.session_state.current_module
             )
             if saved_history:
-                st.session_state.chat_history = saved_history
+                st.session_state.chat_history = new_chat_history(saved_history)
                 return True
         return False
     def render_quiz_interface(self):
@@ -1335,17 +1134,21 @@ class EnhancedStudyBotApp:
             st.success("🎊 Congratulations! You passed!")
             st.balloons()
             
-            modules = self.db.get_all_modules()
-            current_module = modules[st.session_state.current_module]
+            modules = _get_all_modules_cached(self.db.db_path)
+            current_module = st.session_state.current_module_obj
             self.db.update_user_progress(
                 st.session_state.user_id, 
                 current_module['id'], 
                 completed=True, 
                 score=percentage
             )
+            _get_user_progress_cached.clear()
+            _calc_streak_cached.clear()
+            user_progress = _get_user_progress_cached(self.db.db_path, st.session_state.user_id)
+            completed_count = sum(1 for p in user_progress if p['completed'])
             
             self.gamification.award_xp(50, "Passed module quiz!")
-            self.gamification.check_achievements('module_complete', len([m for m in modules if m.get('completed')]))
+            self.gamification.check_achievements('module_complete', completed_count)
             if percentage == 100:
                 self.gamification.check_achievements('quiz_score', 100)
             
@@ -1591,16 +1394,14 @@ class EnhancedStudyBotApp:
         # Show user info in sidebar
         self.render_user_sidebar()
         
-        # Check time limits if parental controls enabled
-        if st.session_state.parental_settings['enabled']:
+        # Check time limits if parental controls enabled; the parent panel is never time-limited
+        if st.session_state.parental_settings.enabled and not st.session_state.show_parent_panel:
             self.check_time_limit_warning()
-            if 'last_time_check' not in st.session_state:
-                st.session_state.last_time_check = datetime.now()
-            
-            time_diff = (datetime.now() - st.session_state.last_time_check).seconds / 60
-            if time_diff >= 1:
+            now = time.monotonic()
+            last_check = st.session_state.setdefault('last_time_check', now)
+            if now - last_check >= 60.0:
                 self.parental_control.increment_session_time(1)
-                st.session_state.last_time_check = datetime.now()
+                st.session_state.last_time_check = now
         
         self.render_header()
         
@@ -1610,8 +1411,13 @@ class EnhancedStudyBotApp:
         
         if not self.load_modules():
             return
+
+        modules = _get_all_modules_cached(self.db.db_path)
+        current = st.session_state.current_module
+        st.session_state.current_module_obj = modules[current] if modules and current < len(modules) else None
             
-        self.render_sidebar()
+        with st.sidebar:
+            self.render_sidebar()
         self.render_chat_interface()
 if __name__ == "__main__":
     app = EnhancedStudyBotApp()
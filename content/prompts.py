@@ -68,13 +68,9 @@ Code Examples Available:
 {json.dumps(module.get('code_examples', []), indent=2)}
 """
     
-    def get_quiz_generation_prompt(self, module: Dict[str, Any], difficult_topics: List[str] = None) -> str:
-        """Generate quiz questions for a module"""
-        difficult_focus = ""
-        if difficult_topics:
-            difficult_focus = f"\nFocus extra questions on these topics the student has struggled with: {', '.join(difficult_topics)}"
-        
-        return f"""Create a quiz for the module "{module['title']}" suitable for kids under 15.
+    def get_quiz_generation_system_prompt(self) -> str:
+        """Get the constant quiz instructions, kept separate so the prompt prefix is cacheable"""
+        return """Create a quiz for the module the user describes, suitable for kids under 15.
 
 Requirements:
 - Generate exactly 5 questions total
@@ -82,32 +78,42 @@ Requirements:
 - Questions should test understanding, not just memorization
 - Use encouraging, friendly language
 - Make sure questions are age-appropriate
-- Include some easier questions to build confidence{difficult_focus}
-
-Module Content:
-{json.dumps(module.get('content', [])[:5], indent=2)}  # Limit content for token efficiency
-
-Code Examples:
-{json.dumps(module.get('code_examples', [])[:3], indent=2)}
+- Include some easier questions to build confidence
+- If the user lists topics the student has struggled with, focus extra questions on them
 
 Return the quiz as JSON in this exact format:
-{{
+{
     "questions": [
-        {{
+        {
             "type": "multiple_choice",
             "question": "What does the print() function do?",
             "options": ["A) Saves a file", "B) Shows text on screen", "C) Deletes code", "D) Creates variables"],
             "correct_answer": "B) Shows text on screen",
             "explanation": "Great! print() displays text on the screen so we can see our results! 🎉"
-        }},
-        {{
+        },
+        {
             "type": "free_response", 
             "question": "Write a line of code that creates a variable called 'age' and stores your age in it.",
             "sample_answer": "age = 12",
             "explanation": "Perfect! You created a variable - that's like making a labeled box to store your age! 📦"
-        }}
+        }
     ]
-}}"""
+}"""
+    
+    def get_quiz_generation_prompt(self, module: Dict[str, Any], difficult_topics: List[str] = None) -> str:
+        """Generate the module-specific part of the quiz request"""
+        difficult_focus = ""
+        if difficult_topics:
+            difficult_focus = f"\nTopics the student has struggled with: {', '.join(difficult_topics)}\n"
+        
+        # Content is limited for token efficiency
+        return f"""Module: "{module['title']}"
+{difficult_focus}
+Module Content:
+{json.dumps(module.get('content', [])[:5], indent=2)}
+
+Code Examples:
+{json.dumps(module.get('code_examples', [])[:3], indent=2)}"""
     
     def get_flashcard_prompt(self, module: Dict[str, Any]) -> str:
         """Alias for get_flashcard_generation_prompt for compatibility"""
@@ -213,7 +219,7 @@ Your goals:
 5. Make them feel supported, not alone
 
 Recent conversation:
-{json.dumps(chat_history[-3:], indent=2) if len(chat_history) >= 3 else json.dumps(chat_history, indent=2)}
+{json.dumps(list(chat_history)[-3:], indent=2)}
 
 Module: "{module['title']}"
 
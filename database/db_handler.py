@@ -1,7 +1,7 @@
 import sqlite3
 import json
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 class DatabaseHandler:
     def __init__(self, db_path: str = "studybot.db"):
@@ -99,13 +99,14 @@ class DatabaseHandler:
             # Clear existing modules to refresh content
             cursor.execute("DELETE FROM modules")
             
-            for i, module in enumerate(modules):
-                cursor.execute("""
-                    INSERT INTO modules (
-                        title, description, content, code_examples, 
-                        exercises, order_index, github_path, updated_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
+            now = datetime.now()
+            cursor.executemany("""
+                INSERT INTO modules (
+                    title, description, content, code_examples, 
+                    exercises, order_index, github_path, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (
                     module['title'],
                     module.get('description', ''),
                     json.dumps(module.get('content', [])),
@@ -113,8 +114,10 @@ class DatabaseHandler:
                     json.dumps(module.get('exercises', [])),
                     i,
                     module.get('github_path', ''),
-                    datetime.now()
-                ))
+                    now
+                )
+                for i, module in enumerate(modules)
+            ])
             
             conn.commit()
     
@@ -124,7 +127,7 @@ class DatabaseHandler:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, title, description, content, code_examples, 
-                       exercises, order_index, github_path
+                       exercises, order_index, github_path, updated_at
                 FROM modules 
                 ORDER BY order_index
             """)
@@ -139,11 +142,17 @@ class DatabaseHandler:
                     'code_examples': json.loads(row[4]) if row[4] else [],
                     'exercises': json.loads(row[5]) if row[5] else [],
                     'order_index': row[6],
-                    'github_path': row[7]
+                    'github_path': row[7],
+                    'updated_at': row[8]
                 })
             
             return modules
     
+    def get_module_count(self) -> int:
+        """Count stored modules without loading them"""
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(1) FROM modules").fetchone()[0]
+    
     def get_module_by_id(self, module_id: int) -> Optional[Dict[str, Any]]:
         """Get a specific module by ID"""
         with sqlite3.connect(self.db_path) as conn:
@@ -196,33 +205,35 @@ class DatabaseHandler:
     def update_user_progress(self, user_id: str, module_id: int, completed: bool = False, 
                            score: float = 0, time_spent: int = 0):
         """Update or insert user progress for a module"""
+        self.update_user_progress_many(user_id, [module_id], completed, score, time_spent)
+    
+    def update_user_progress_many(self, user_id: str, module_ids: List[int], completed: bool = False,
+                                  score: float = 0, time_spent: int = 0):
+        """Update or insert the same progress for several modules in one transaction"""
+        now = datetime.now()
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
             
-            # Check if progress exists
+            # Existing progress rows for this user, by module
             cursor.execute("""
-                SELECT id, attempts FROM user_progress 
-                WHERE user_id = ? AND module_id = ?
-            """, (user_id, module_id))
+                SELECT module_id, id, attempts FROM user_progress 
+                WHERE user_id = ?
+            """, (user_id,))
+            existing = {module_id: (progress_id, attempts) for module_id, progress_id, attempts in cursor.fetchall()}
             
-            result = cursor.fetchone()
+            cursor.executemany("""
+                UPDATE user_progress 
+                SET completed = ?, score = ?, attempts = ?, 
+                    time_spent = time_spent + ?, last_accessed = ?
+                WHERE id = ?
+            """, [(completed, score, existing[m][1] + 1, time_spent, now, existing[m][0])
+                  for m in module_ids if m in existing])
             
-            if result:
-                # Update existing progress
-                progress_id, attempts = result
-                cursor.execute("""
-                    UPDATE user_progress 
-                    SET completed = ?, score = ?, attempts = ?, 
-                        time_spent = time_spent + ?, last_accessed = ?
-                    WHERE id = ?
-                """, (completed, score, attempts + 1, time_spent, datetime.now(), progress_id))
-            else:
-                # Insert new progress
-                cursor.execute("""
-                    INSERT INTO user_progress 
-                    (user_id, module_id, completed, score, attempts, time_spent, last_accessed)
-                    VALUES (?, ?, ?, ?, 1, ?, ?)
-                """, (user_id, module_id, completed, score, time_spent, datetime.now()))
+            cursor.executemany("""
+                INSERT INTO user_progress 
+                (user_id, module_id, completed, score, attempts, time_spent, last_accessed)
+                VALUES (?, ?, ?, ?, 1, ?, ?)
+            """, [(user_id, m, completed, score, time_spent, now) for m in module_ids if m not in existing])
             
             conn.commit()
     
@@ -305,21 +316,26 @@ class DatabaseHandler:
     def save_chat_message(self, user_id: str, module_id: int, role: str, content: str, 
                          interaction_type: str = 'chat'):
         """Save individual chat messages for session persistence"""
+        self.save_chat_messages(user_id, module_id, [(role, content)], interaction_type)
+    
+    def save_chat_messages(self, user_id: str, module_id: int, messages: List[Tuple[str, str]],
+                           interaction_type: str = 'chat'):
+        """Save several (role, content) chat messages in one transaction"""
         with sqlite3.connect(self.db_path) as conn:
             cursor = conn.cursor()
-            cursor.execute("""
+            cursor.executemany("""
                 INSERT INTO learning_interactions 
                 (user_id, module_id, question, user_response, bot_response, 
                  interaction_type, understanding_level)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (
+            """, [(
                 user_id, module_id, 
                 
                 content if role == 'user' else '','',  # user_response
                 content if role == 'assistant' else '',  # bot_response
                 f"{interaction_type}_{role}",  # interaction_type with role
                 3  # default understanding level
-            ))
+            ) for role, content in messages])
             conn.commit()
     
     def load_chat_history(self, user_id: str, module_id: int, limit: int = 50) -> List[Dict[str, str]]:
@@ -331,7 +347,7 @@ class DatabaseHandler:
                 FROM learning_interactions 
                 WHERE user_id = ? AND module_id = ? 
                 AND interaction_type LIKE 'socratic_%'
-                ORDER BY created_at ASC
+                ORDER BY created_at ASC, id ASC
                 LIMIT ?
             """, (user_id, module_id, limit))
             
@@ -354,6 +370,20 @@ class DatabaseHandler:
             
             return chat_history
     
+    def get_activity_dates(self, user_id: str) -> List[str]:
+        """Distinct local dates (YYYY-MM-DD) with any chat, quiz or progress activity, newest first"""
+        with sqlite3.connect(self.db_path) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT date(created_at, 'localtime') FROM learning_interactions WHERE user_id = ?
+                UNION
+                SELECT date(completed_at, 'localtime') FROM quiz_results WHERE user_id = ?
+                UNION
+                SELECT date(last_accessed) FROM user_progress WHERE user_id = ?
+                ORDER BY 1 DESC
+            """, (user_id, user_id, user_id))
+            return [row[0] for row in cursor.fetchall() if row[0]]
+    
     def clear_chat_history(self, user_id: str, module_id: int):
         """Clear chat history for a specific user and module"""
         with sqlite3.connect(self.db_path) as conn:
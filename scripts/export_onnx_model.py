@@ -0,0 +1,38 @@
+"""Export the embedding model to ONNX and quantize its weights to int8 for faster CPU inference.
+
+One-off, run from the project root:  pip install "optimum[onnxruntime]" && python scripts/export_onnx_model.py
+utils/embedding_model.py picks up models/<name>-onnx/model_q.onnx automatically once it exists.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.embedding_model import ONNX_MODEL_ROOT
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export and quantize the sentence embedding model")
+    parser.add_argument('--model', default="all-MiniLM-L6-v2", help="sentence-transformers model name")
+    args = parser.parse_args()
+
+    from optimum.onnxruntime import ORTModelForFeatureExtraction
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoTokenizer
+
+    model_id = f"sentence-transformers/{args.model}"
+    output_dir = os.path.join(ONNX_MODEL_ROOT, f"{args.model}-onnx")
+
+    print(f"📦 Exporting {model_id} to {output_dir}")
+    ORTModelForFeatureExtraction.from_pretrained(model_id, export=True).save_pretrained(output_dir)
+    AutoTokenizer.from_pretrained(model_id).save_pretrained(output_dir)
+
+    quantize_dynamic(os.path.join(output_dir, "model.onnx"), os.path.join(output_dir, "model_q.onnx"),
+                     weight_type=QuantType.QInt8)
+    print(f"✅ Wrote {os.path.join(output_dir, 'model_q.onnx')}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
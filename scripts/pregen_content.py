@@ -0,0 +1,74 @@
+"""Pregenerate exercises and quizzes for every module into content/pregen/.
+
+Run from the project root (e.g. nightly):  python scripts/pregen_content.py --variants 20
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.db_handler import DatabaseHandler
+from content.prompts import PromptManager
+from agents.code_evaluator import CodeEvaluator
+from agents.quiz_generator import QuizGenerator
+from utils.openai_client import OpenAIClient
+from utils.response_cache import ResponseCache
+from utils.content_pool import ContentPool
+
+DIFFICULTIES = ['beginner', 'intermediate', 'advanced']
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pregenerate exercises and quizzes for every module")
+    parser.add_argument('--variants', type=int, default=20, help="variants to request per module and difficulty")
+    parser.add_argument('--temperature', type=float, default=0.8)
+    parser.add_argument('--db', default="studybot.db")
+    args = parser.parse_args()
+
+    client = OpenAIClient()
+    if not client.client:
+        print("❌ OPENAI_API_KEY is not set, nothing to generate")
+        return 1
+
+    prompts = PromptManager()
+    cache = ResponseCache(persist_path=None)
+    pool = ContentPool()
+    evaluator = CodeEvaluator(client, cache, content_pool=pool)
+    quiz_generator = QuizGenerator(client, prompts, cache, content_pool=pool)
+
+    modules = DatabaseHandler(args.db).get_all_modules()
+    print(f"📚 Pregenerating content for {len(modules)} modules")
+
+    for module in modules:
+        exercises = {}
+        for difficulty in DIFFICULTIES:
+            prompt = evaluator.get_exercise_prompt(module, difficulty)
+            results = client.run_batch([
+                client.generate_response_async(prompt, evaluator.EXERCISE_SYSTEM_PROMPT,
+                                               temperature=args.temperature, max_tokens=200)
+                for _ in range(args.variants)
+            ])
+            # Same filter as live generation; duplicates are dropped
+            exercises[difficulty] = list(dict.fromkeys(
+                exercise for exercise in results
+                if exercise and len(exercise) > 20 and not exercise.startswith(("❌", "⏳"))
+            ))
+
+        prompt = prompts.get_quiz_generation_prompt(module)
+        results = client.run_batch([
+            client.generate_json_response_async(prompt, prompts.get_quiz_generation_system_prompt(),
+                                                temperature=args.temperature)
+            for _ in range(args.variants)
+        ])
+        quizzes = [quiz for quiz in results if quiz and quiz_generator.validate_quiz(quiz)]
+
+        pool.save(module, exercises, quizzes)
+        counts = ', '.join(f"{difficulty}: {len(items)}" for difficulty, items in exercises.items())
+        print(f"✅ {module['title']} — exercises ({counts}), quizzes: {len(quizzes)}")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+import json
+import os
+import random
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+
+class ContentPool:
+    """Pregenerated exercises and quizzes, served without calling the LLM (see scripts/pregen_content.py)"""
+
+    def __init__(self, directory: str = os.path.join(os.path.dirname(os.path.dirname(__file__)), "content", "pregen")):
+        self.directory = directory
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._lock = threading.Lock()
+        self._rng = random.Random()
+
+    @staticmethod
+    def module_key(module: Dict[str, Any]) -> str:
+        """Stable file-name key for a module (database ids differ between installs, paths don't)"""
+        name = module.get('github_path') or module.get('title') or str(module.get('id', 'module'))
+        return re.sub(r'[^a-z0-9]+', '_', name.lower()).strip('_')
+
+    def get_exercise(self, module: Dict[str, Any], difficulty: str) -> Optional[str]:
+        """Pick a pregenerated exercise for this module and difficulty, if there are any"""
+        exercises = self._get_entry(module).get('exercises', {}).get(difficulty)
+        return self._rng.choice(exercises) if exercises else None
+
+    def get_quiz(self, module: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Pick a pregenerated quiz for this module, if there are any"""
+        quizzes = self._get_entry(module).get('quizzes')
+        if not quizzes:
+            return None
+        # Copy so personalizing the quiz doesn't change the pool
+        return json.loads(json.dumps(self._rng.choice(quizzes)))
+
+    def save(self, module: Dict[str, Any], exercises: Dict[str, List[str]], quizzes: List[Dict[str, Any]]):
+        """Write a module's pool to disk, replacing what was there"""
+        key = self.module_key(module)
+        entry = {'title': module.get('title'), 'exercises': exercises, 'quizzes': quizzes}
+
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, f"{key}.json"), 'w', encoding='utf-8') as f:
+            json.dump(entry, f, indent=2, ensure_ascii=False)
+
+        with self._lock:
+            if self._entries is not None:
+                self._entries[key] = entry
+
+    def _get_entry(self, module: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load()
+            return self._entries.get(self.module_key(module), {})
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        entries = {}
+        if not os.path.isdir(self.directory):
+            return entries
+
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    entries[name[:-5]] = json.load(f)
+            except Exception as e:
+                print(f"Skipping pregenerated content {name}: {e}")
+        return entries
@@ -0,0 +1,86 @@
+import os
+import threading
+from typing import List, Union
+
+import numpy as np
+
+ONNX_MODEL_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models")
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+class OnnxEmbeddingModel:
+    """Int8-quantized ONNX export of a sentence-transformers model (see scripts/export_onnx_model.py)
+
+    Exposes the subset of the SentenceTransformer interface the app uses: encode() with mean pooling
+    and optional L2 normalization, and get_sentence_embedding_dimension().
+    """
+
+    def __init__(self, model_dir: str, max_length: int = 256):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.enable_padding()
+        self.session = onnxruntime.InferenceSession(os.path.join(model_dir, "model_q.onnx"),
+                                                    providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self._dimension = self.session.get_outputs()[0].shape[-1]
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._dimension
+
+    def encode(self, sentences: Union[str, List[str]], batch_size: int = 32,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """Embed one text (returns a vector) or a list of texts (returns a float32 matrix)"""
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+
+        batches = [self._encode_batch(texts[start:start + batch_size], normalize_embeddings)
+                   for start in range(0, len(texts), batch_size)]
+        embeddings = np.concatenate(batches) if batches else np.empty((0, self._dimension), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def _encode_batch(self, texts: List[str], normalize: bool) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        inputs = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        token_embeddings = self.session.run(None, {k: v for k, v in inputs.items() if k in self._input_names})[0]
+
+        # Mean pooling over real tokens, as sentence-transformers does
+        mask = inputs['attention_mask'][:, :, None].astype(np.float32)
+        embeddings = (token_embeddings * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if normalize:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32, copy=False)
+
+
+def _load_model(model_name: str):
+    model_dir = os.path.join(ONNX_MODEL_ROOT, f"{model_name}-onnx")
+    if os.path.exists(os.path.join(model_dir, "model_q.onnx")):
+        try:
+            return OnnxEmbeddingModel(model_dir)
+        except Exception as e:
+            print(f"Loading ONNX model failed, using sentence-transformers: {e}")
+
+    # Imported here so modules that may never embed anything don't pay for torch at import time
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(model_name)
+
+
+def get_embedding_model(model_name: str = "all-MiniLM-L6-v2"):
+    """Load an embedding model once per process and share it between everything that embeds text
+
+    Uses the quantized ONNX export in models/<name>-onnx when present, otherwise SentenceTransformer.
+    """
+    with _models_lock:
+        model = _models.get(model_name)
+        if model is None:
+            model = _load_model(model_name)
+            _models[model_name] = model
+        return model
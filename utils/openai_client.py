@@ -1,18 +1,31 @@
-import openai
 import os
 import time
-from typing import Optional, Dict, List, Any
+import asyncio
+import contextvars
+from typing import Optional, Dict, List, Any, Awaitable, Iterator
 import json
 import streamlit as st
 from dotenv import load_dotenv    # For loading .env files
 
+# Async client for the batch currently running; set by run_batch()
+_batch_client = contextvars.ContextVar('openai_batch_client', default=None)
+
+
+class StreamError(str):
+    """A chunk a stream yields in place of model output: an error or the "no API key" placeholder
+
+    It is still a str, so it can be shown like any other chunk, but a response containing one must not be cached.
+    """
+
 class OpenAIClient:
     def __init__(self):
         """Initialize OpenAI client"""
         self.client = None
+        self.api_key = None
         self.model = "gpt-3.5-turbo"
         self.max_retries = 3
         self.retry_delay = 2
+        self.max_batch_connections = 32
         self.setup_client()
     
     def setup_client(self):
@@ -34,8 +47,12 @@ class OpenAIClient:
                 self.client = None
                 return False
             
+            # Imported only once there's a key, so sessions without AI never load the SDK
+            import openai
+            
             # Create OpenAI client with minimal parameters
             self.client = openai.OpenAI(api_key=api_key)
+            self.api_key = api_key
             return True
             
         except Exception as e:
@@ -48,6 +65,7 @@ class OpenAIClient:
         """Generate a response using OpenAI API"""
         if not self.client:
             return "🤖 Hi! I'm StudyBot, but I need an OpenAI API key to provide personalized responses. For now, you can explore the learning modules and practice coding exercises. To enable AI features, please set your OPENAI_API_KEY environment variable."
+        import openai
         
         messages = []
         if system_prompt:
@@ -91,6 +109,62 @@ class OpenAIClient:
         
         return "❌ I tried several times but couldn't generate a response. Please try again!"
     
+    def generate_response_stream(self, prompt: str, system_prompt: str = "",
+                                 temperature: float = 0.7, max_tokens: int = 1000) -> Iterator[str]:
+        """Streaming version of generate_response that yields text chunks as they arrive"""
+        if not self.client:
+            yield StreamError(self.generate_response(prompt, system_prompt, temperature, max_tokens))
+            return
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        yield from self.generate_chat_response_stream(messages, temperature, max_tokens)
+    
+    def generate_chat_response_stream(self, messages: List[Dict[str, str]],
+                                      temperature: float = 0.7, max_tokens: int = 800) -> Iterator[str]:
+        """Streaming version of generate_chat_response that yields text chunks as they arrive"""
+        if not self.client:
+            yield StreamError(self.generate_chat_response(messages, temperature, max_tokens))
+            return
+        import openai
+        
+        # Limit conversation history to last 10 messages to stay within token limits
+        limited_messages = messages[-10:] if len(messages) > 10 else messages
+        
+        for attempt in range(self.max_retries):
+            started = False
+            try:
+                stream = self.client.chat.completions.create(
+                    model=self.model,
+                    messages=limited_messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=30,
+                    stream=True
+                )
+                
+                for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        started = True
+                        yield chunk.choices[0].delta.content
+                return
+                
+            except (openai.RateLimitError, openai.APITimeoutError):
+                # Only retry if nothing has been shown yet, otherwise the text would repeat
+                if not started and attempt < self.max_retries - 1:
+                    time.sleep((attempt + 1) * self.retry_delay)
+                    continue
+                yield StreamError("⏳ I'm getting too many requests right now. Please try again in a moment!")
+                return
+                
+            except Exception as e:
+                print(f"Streaming OpenAI request failed: {e}")
+                yield StreamError("❌ Sorry, I'm having trouble connecting to my brain right now. Please try again!")
+                return
+    
     def generate_chat_response(self, messages: List[Dict[str, str]], 
                               temperature: float = 0.7, max_tokens: int = 800) -> str:
         """Generate response from a conversation history"""
@@ -128,6 +202,10 @@ class OpenAIClient:
             prompt, system_prompt, temperature, max_tokens=1500
         )
         
+        return self.parse_json_response(response_text)
+    
+    def parse_json_response(self, response_text: str) -> Optional[Dict]:
+        """Extract and parse the JSON payload from a model response"""
         if response_text.startswith("❌") or response_text.startswith("⏳"):
             return None
         
@@ -161,6 +239,73 @@ class OpenAIClient:
             st.error(f"❌ Error processing JSON response: {str(e)}")
             return None
     
+    def run_batch(self, requests: List[Awaitable[Any]]) -> List[Any]:
+        """Run several async requests concurrently over one pooled connection, in order"""
+        if not requests:
+            return []
+        
+        async def gather_all():
+            if not self.client:
+                return await asyncio.gather(*requests, return_exceptions=True)
+            import httpx
+            import openai
+            
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=self.max_batch_connections)
+            )
+            async with openai.AsyncOpenAI(api_key=self.api_key, http_client=http_client) as async_client:
+                _batch_client.set(async_client)
+                return await asyncio.gather(*requests, return_exceptions=True)
+        
+        results = asyncio.run(gather_all())
+        return [None if isinstance(result, Exception) else result for result in results]
+    
+    async def generate_response_async(self, prompt: str, system_prompt: str = "",
+                                      temperature: float = 0.7, max_tokens: int = 1000) -> str:
+        """Async version of generate_response, for use inside run_batch()"""
+        async_client = _batch_client.get()
+        if not self.client or async_client is None:
+            return "❌ AI features are not available right now."
+        import openai
+        
+        messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+        messages.append({"role": "user", "content": prompt})
+        
+        for attempt in range(self.max_retries):
+            try:
+                response = await async_client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=30
+                )
+                
+                return response.choices[0].message.content.strip()
+                
+            except (openai.RateLimitError, openai.APITimeoutError):
+                if attempt < self.max_retries - 1:
+                    await asyncio.sleep((attempt + 1) * self.retry_delay)
+                    continue
+                return "⏳ I'm getting too many requests right now. Please try again in a moment!"
+                
+            except Exception as e:
+                print(f"Async OpenAI request failed: {e}")
+                return "❌ Sorry, I'm having trouble connecting to my brain right now. Please try again!"
+        
+        return "❌ I tried several times but couldn't generate a response. Please try again!"
+    
+    async def generate_json_response_async(self, prompt: str, system_prompt: str = "",
+                                           temperature: float = 0.3) -> Optional[Dict]:
+        """Async version of generate_json_response, for use inside run_batch()"""
+        response_text = await self.generate_response_async(
+            prompt, system_prompt, temperature, max_tokens=1500
+        )
+        
+        return self.parse_json_response(response_text)
+    
     def evaluate_code_safety(self, code: str) -> bool:
         """Basic safety check for user code"""
         dangerous_patterns = [
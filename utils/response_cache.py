@@ -0,0 +1,118 @@
+import copy
+import hashlib
+import os
+import shelve
+import textwrap
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class ResponseCache:
+    """Exact-match cache for LLM responses with LRU eviction, TTL and on-disk persistence"""
+
+    def __init__(self, maxsize: int = 1024, ttl: int = 24 * 60 * 60,
+                 persist_path: Optional[str] = ".studybot_data/response_cache"):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        # Disk access has its own lock, so in-memory hits never wait behind a shelve read or write
+        self._disk_lock = threading.Lock()
+        self._disk_keys = None  # Keys in the shelve, read on first disk access so misses skip it
+
+        if persist_path:
+            os.makedirs(os.path.dirname(persist_path) or ".", exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Hash the request parts (template id, module, difficulty, prompt, params) into a cache key"""
+        hasher = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            hasher.update(repr(part).encode("utf-8"))
+            hasher.update(b"\x00")
+        return hasher.hexdigest()
+
+    @staticmethod
+    def normalize_text(text: str) -> str:
+        """Remove indentation and blank-line differences that shouldn't change the cache key"""
+        lines = [line.rstrip() for line in textwrap.dedent(text).strip().splitlines()]
+        normalized = []
+        for line in lines:
+            if line or (normalized and normalized[-1]):
+                normalized.append(line)
+        return "\n".join(normalized)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Return a cached response, or None on a miss or expired entry"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load_from_disk(key)
+            if entry is None:
+                return None
+
+        expires_at, value = entry
+        with self._lock:
+            # Another thread may have stored a newer entry meanwhile; leave that one alone
+            current = self._entries.get(key)
+            if expires_at < now:
+                if current is entry:
+                    self._entries.pop(key)
+                return None
+            if current is None or current is entry:
+                self._store(key, entry)
+
+        # Callers are free to mutate what they get back (e.g. quiz personalization)
+        return copy.deepcopy(value)
+
+    def set(self, key: str, value: Any):
+        """Store a response under the given key"""
+        entry = (time.time() + self.ttl, copy.deepcopy(value))
+
+        with self._lock:
+            self._store(key, entry)
+        self._save_to_disk(key, entry)
+
+    def clear(self):
+        """Drop all in-memory entries"""
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, key: str, entry: tuple):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _load_from_disk(self, key: str) -> Optional[tuple]:
+        if not self.persist_path:
+            return None
+        with self._disk_lock:
+            if self._disk_keys is not None and key not in self._disk_keys:
+                return None
+            try:
+                with shelve.open(self.persist_path) as db:
+                    if self._disk_keys is None:
+                        self._disk_keys = set(db.keys())
+                    return db.get(key)
+            except Exception as e:
+                print(f"Response cache read failed: {e}")
+                return None
+
+    def _save_to_disk(self, key: str, entry: tuple):
+        if not self.persist_path:
+            return
+        with self._disk_lock:
+            try:
+                with shelve.open(self.persist_path) as db:
+                    if self._disk_keys is None:
+                        self._disk_keys = set(db.keys())
+                    db[key] = entry
+                self._disk_keys.add(key)
+            except Exception as e:
+                print(f"Response cache write failed: {e}")
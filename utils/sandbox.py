@@ -0,0 +1,205 @@
+import ast
+import builtins
+import hashlib
+import io
+import math
+import multiprocessing
+import os
+import signal
+import threading
+from collections import OrderedDict
+from contextlib import redirect_stderr, redirect_stdout
+from types import CodeType
+from typing import Any, Dict, Iterable, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; submissions then run in-process
+    resource = None
+
+# Worker processes that run student code under resource limits, shared by every evaluator.
+# They come from a forkserver (spawn where there is none), never from forking the threaded Streamlit
+# server, so they can't inherit a lock some other thread held, and they import only this module.
+_pool = None
+_pool_lock = threading.Lock()
+# Globals every submission in a worker starts from, built once by _init_worker
+_worker_globals: Dict[str, Any] = {}
+# Set once the running submission has been told it is out of CPU time
+_cpu_limit_hit = False
+
+TIMEOUT_RESULT = {
+    'success': False,
+    'output': '',
+    'errors': "Timeout: your code took too long to run. Check for loops that never end!",
+    'error_type': 'timeout'
+}
+
+
+class CPULimitExceeded(BaseException):
+    """Raised inside a sandbox worker when a submission uses up its CPU time"""
+
+
+# Compiled submissions keyed by source hash, so re-running the same snippet skips compilation.
+# Each worker keeps its own, as does the server process for in-process runs
+CODE_CACHE_SIZE = 256
+_code_cache = OrderedDict()
+_code_cache_lock = threading.Lock()
+
+# Output buffers and redirects are reused between runs, one set per thread
+_io_pool = threading.local()
+
+
+def make_globals_template(safe_builtins: Dict[str, Any]) -> Dict[str, Any]:
+    """Globals template for execute, built once and copied for every run"""
+    return {'__builtins__': dict(safe_builtins), '__name__': '__main__'}
+
+
+def new_buffers() -> tuple:
+    """Fresh stdout/stderr buffers with their redirect context managers"""
+    stdout_buffer, stderr_buffer = io.StringIO(), io.StringIO()
+    return stdout_buffer, stderr_buffer, redirect_stdout(stdout_buffer), redirect_stderr(stderr_buffer)
+
+
+def get_buffers() -> tuple:
+    """Return this thread's stdout/stderr buffers, emptied, with their redirect context managers"""
+    if not hasattr(_io_pool, 'buffers'):
+        _io_pool.buffers = new_buffers()
+    
+    for buffer in _io_pool.buffers[:2]:
+        buffer.seek(0)
+        buffer.truncate()
+    return _io_pool.buffers
+
+
+def get_code_object(code: str, tree: Optional[ast.AST] = None) -> CodeType:
+    """Compile student code, reusing the code object from an earlier run of the same source"""
+    key = hashlib.blake2b(code.encode('utf-8'), digest_size=8).digest()
+    with _code_cache_lock:
+        code_obj = _code_cache.get(key)
+        if code_obj is not None:
+            _code_cache.move_to_end(key)
+            return code_obj
+    
+    # Reuse an already parsed tree instead of parsing the source again
+    code_obj = compile(tree if tree is not None else code, '<user>', 'exec')
+    
+    with _code_cache_lock:
+        _code_cache[key] = code_obj
+        if len(_code_cache) > CODE_CACHE_SIZE:
+            _code_cache.popitem(last=False)
+    return code_obj
+
+
+def execute(code: str, globals_template: Dict[str, Any], tree: Optional[ast.AST] = None) -> Dict[str, Any]:
+    """Run student code in a copy of globals_template, capturing its output
+
+    tree is the code's already parsed AST, if the caller has one.
+    """
+    stdout_buffer, stderr_buffer, redirect_out, redirect_err = get_buffers()
+    try:
+        code_obj = get_code_object(code, tree)
+
+        # Builtins get their own copy too, so nothing a run does to them can leak into the next submission.
+        # They stay a plain dict (not a read-only proxy) because CPython's fast builtin lookup needs one
+        safe_globals = globals_template.copy()
+        safe_globals['__builtins__'] = globals_template['__builtins__'].copy()
+        safe_locals = {}
+
+        with redirect_out, redirect_err:
+            exec(code_obj, safe_globals, safe_locals)
+
+        errors = stderr_buffer.getvalue()
+        return {
+            'success': True,
+            'output': stdout_buffer.getvalue(),
+            'errors': errors if errors else None,
+            'variables': {k: str(v) for k, v in safe_locals.items() if not k.startswith('_')}
+        }
+
+    except SyntaxError as e:
+        return {
+            'success': False,
+            'output': '',
+            'errors': f"Syntax Error: {str(e)}",
+            'error_type': 'syntax'
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'output': '',
+            'errors': str(e) or type(e).__name__,
+            'error_type': 'runtime'
+        }
+
+
+def _init_worker(memory_bytes: int, builtin_names: tuple):
+    """Set up a sandbox worker: cap its memory and build the globals submissions start from"""
+    _worker_globals.update(make_globals_template({name: getattr(builtins, name) for name in builtin_names}))
+    signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    try:
+        # Measured in this fresh worker, so the cap doesn't grow with the size of the server process
+        with open('/proc/self/statm') as statm:
+            baseline = int(statm.read().split()[0]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        baseline = 0
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (baseline + memory_bytes, baseline + memory_bytes))
+    except (OSError, ValueError) as e:
+        print(f"Could not limit sandbox memory: {e}")
+
+
+def _on_cpu_limit(signum, frame):
+    """SIGXCPU handler: stop the submission, or the whole worker if it ignored the first signal"""
+    global _cpu_limit_hit
+    if _cpu_limit_hit:
+        os._exit(1)
+    _cpu_limit_hit = True
+    raise CPULimitExceeded()
+
+
+def run_submission(code: str, cpu_seconds: int) -> Dict[str, Any]:
+    """Execute one submission inside a sandbox worker"""
+    global _cpu_limit_hit
+    _cpu_limit_hit = False
+    # RLIMIT_CPU counts the worker's whole lifetime in whole seconds, so allow at least cpu_seconds
+    # beyond what it has used so far
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    resource.setrlimit(resource.RLIMIT_CPU, (math.ceil(usage.ru_utime + usage.ru_stime + cpu_seconds), hard))
+    try:
+        return execute(code, _worker_globals)
+    except CPULimitExceeded:
+        return dict(TIMEOUT_RESULT)
+    finally:
+        # No SIGXCPU while the worker is idle or returning the result
+        resource.setrlimit(resource.RLIMIT_CPU, (hard, hard))
+
+
+def get_pool(memory_bytes: int, builtin_names: Iterable[str]):
+    """Start the shared sandbox worker pool on first use, or return None where it can't run (no resource module)"""
+    global _pool
+    if resource is None:
+        return None
+
+    with _pool_lock:
+        if _pool is None:
+            if 'forkserver' in multiprocessing.get_all_start_methods():
+                context = multiprocessing.get_context('forkserver')
+                context.set_forkserver_preload([__name__])
+            else:
+                context = multiprocessing.get_context('spawn')
+            _pool = context.Pool(
+                processes=min(4, os.cpu_count() or 1),
+                initializer=_init_worker,
+                initargs=(memory_bytes, tuple(builtin_names))
+            )
+        return _pool
+
+
+def reset_pool():
+    """Shut down the shared sandbox pool so the next submission starts a fresh one"""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.terminate()
@@ -0,0 +1,108 @@
+import ast
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from utils.embedding_model import get_embedding_model
+
+
+class SemanticCache:
+    """Embedding-similarity cache that reuses LLM responses for near-identical requests
+
+    Entries live in memory only and are lost on restart. Exact repeats are still served from
+    ResponseCache's on-disk store, so only near-duplicate matching starts cold.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", maxsize: int = 2048):
+        self.model_name = model_name
+        self.maxsize = maxsize
+        self._model = None
+        self._model_failed = False
+        self._vectors: Dict[str, List[np.ndarray]] = {}
+        self._responses: Dict[str, List[str]] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize_code(code: str) -> str:
+        """Strip comments and formatting differences so equivalent code embeds identically"""
+        try:
+            return ast.unparse(ast.parse(code))
+        except (SyntaxError, ValueError):
+            return "\n".join(line.rstrip() for line in code.strip().splitlines() if line.strip())
+
+    def lookup(self, namespace: str, text: str, threshold: float) -> Optional[str]:
+        """Return the stored response whose request is most similar to text, if above threshold"""
+        if not self._responses.get(namespace):
+            return None
+        query = self._embed(text)
+        if query is None:
+            return None
+        return self.lookup_vector(namespace, query, threshold)
+
+    def lookup_vector(self, namespace: str, query: np.ndarray, threshold: float) -> Optional[str]:
+        """Same as lookup() for callers that already have a unit-normalized embedding"""
+        with self._lock:
+            if not self._responses.get(namespace):
+                return None
+            responses = list(self._responses[namespace])
+            matrix = self._get_matrix(namespace)
+
+        # Vectors are unit-normalized, so the inner product is the cosine similarity
+        scores = matrix @ query
+        best = int(np.argmax(scores))
+        if scores[best] >= threshold:
+            return responses[best]
+        return None
+
+    def add(self, namespace: str, text: str, response: str):
+        """Remember a response for future similar requests"""
+        vector = self._embed(text)
+        if vector is not None:
+            self.add_vector(namespace, vector, response)
+
+    def add_vector(self, namespace: str, vector: np.ndarray, response: str):
+        """Same as add() for callers that already have a unit-normalized embedding"""
+        with self._lock:
+            vectors = self._vectors.setdefault(namespace, [])
+            responses = self._responses.setdefault(namespace, [])
+            vectors.append(np.asarray(vector, dtype=np.float32))
+            responses.append(response)
+
+            # Drop the oldest entries once the namespace is full
+            if len(vectors) > self.maxsize:
+                del vectors[0]
+                del responses[0]
+
+            self._matrices.pop(namespace, None)
+
+    def embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """Unit-normalized embeddings for texts with the cache's model, or None if it can't be loaded"""
+        model = self._get_model()
+        if model is None:
+            return None
+        return np.asarray(model.encode(texts, normalize_embeddings=True), dtype=np.float32)
+
+    def _get_matrix(self, namespace: str) -> np.ndarray:
+        matrix = self._matrices.get(namespace)
+        if matrix is None:
+            matrix = np.vstack(self._vectors[namespace])
+            self._matrices[namespace] = matrix
+        return matrix
+
+    def _embed(self, text: str) -> Optional[np.ndarray]:
+        model = self._get_model()
+        if model is None:
+            return None
+        return np.asarray(model.encode(text, normalize_embeddings=True), dtype=np.float32)
+
+    def _get_model(self):
+        # Loaded on first use so the app starts without paying for the model
+        if self._model is None and not self._model_failed:
+            try:
+                self._model = get_embedding_model(self.model_name)
+            except Exception as e:
+                print(f"Semantic cache disabled: {e}")
+                self._model_failed = True
+        return self._model
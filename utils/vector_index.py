@@ -0,0 +1,206 @@
+import os
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # Optional; exact search with numpy is used instead
+    faiss = None
+
+
+class VectorIndex:
+    """In-memory cosine-similarity index over unit-normalized embeddings, using FAISS when installed
+
+    Small indexes use HNSW; past IVFPQ_MIN_SIZE vectors the graph is replaced by a trained IVFPQ index.
+    Vectors are expected to be L2-normalized already (e.g. encode(..., normalize_embeddings=True)),
+    so similarity is a plain inner product.
+    """
+
+    # Inverted-file + product-quantization settings for large indexes
+    IVFPQ_MIN_SIZE = 10_000
+    IVF_LISTS = 100
+    IVF_NPROBE = 8
+    PQ_SUBVECTORS = 48
+    PQ_BITS = 8
+
+    def __init__(self, dim: int, hnsw_neighbors: int = 32):
+        self.dim = dim
+        self.hnsw_neighbors = hnsw_neighbors
+        self._matrix = np.empty((0, dim), dtype=np.float32)
+        self._ids = np.empty(0, dtype=np.int64)
+        self._types = np.empty(0, dtype=object)
+        self._ann = self._build_ann(self._matrix)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    @staticmethod
+    def normalize(vectors: np.ndarray) -> np.ndarray:
+        """L2-normalize rows so the inner product is the cosine similarity"""
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    @staticmethod
+    def quantize(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Scalar-quantize unit vectors to int8 codes with one float32 scale per vector"""
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        scales = (np.maximum(np.abs(vectors).max(axis=1), 1e-12) / 127).astype(np.float32)
+        codes = np.round(vectors / scales[:, None]).astype(np.int8)
+        return codes, scales
+
+    @staticmethod
+    def dequantize(codes: np.ndarray, scales: np.ndarray) -> np.ndarray:
+        return codes.astype(np.float32) * scales[:, None]
+
+    def to_blob(self, vector: np.ndarray) -> bytes:
+        """Storage format for one embedding: dim int8 codes followed by a float32 scale"""
+        codes, scales = self.quantize(vector)
+        return codes.tobytes() + scales.tobytes()
+
+    def from_blobs(self, blobs: List[bytes]) -> np.ndarray:
+        """Decode stored embeddings into a float32 matrix; older raw float32 blobs are still read and normalized"""
+        matrix = np.empty((len(blobs), self.dim), dtype=np.float32)
+        quantized = np.fromiter((len(blob) == self.dim + 4 for blob in blobs), dtype=bool, count=len(blobs))
+
+        if quantized.any():
+            raw = np.frombuffer(b"".join(b for b, q in zip(blobs, quantized) if q), dtype=np.uint8)
+            raw = raw.reshape(-1, self.dim + 4)
+            scales = np.ascontiguousarray(raw[:, self.dim:]).view(np.float32).ravel()
+            matrix[quantized] = self.dequantize(raw[:, :self.dim].view(np.int8), scales)
+        if not quantized.all():
+            raw = np.frombuffer(b"".join(b for b, q in zip(blobs, quantized) if not q), dtype=np.float32)
+            matrix[~quantized] = self.normalize(raw.reshape(-1, self.dim))
+        return matrix
+
+    def add(self, ids: List[int], vectors: np.ndarray, content_types: List[str]):
+        """Add embeddings for the given row ids"""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        types = np.empty(len(content_types), dtype=object)
+        types[:] = content_types
+
+        with self._lock:
+            self._matrix = np.concatenate([self._matrix, vectors])
+            self._ids = np.concatenate([self._ids, np.asarray(ids, dtype=np.int64)])
+            self._types = np.concatenate([self._types, types])
+            if self._ann is None:
+                return
+            if len(self._ids) >= self.IVFPQ_MIN_SIZE and not self._is_ivfpq(self._ann):
+                # Crossed the size threshold: train IVFPQ on the whole corpus instead of growing the graph
+                self._ann = self._build_ann(self._matrix)
+            else:
+                self._ann.add(np.ascontiguousarray(vectors))
+
+    def save(self, path: str):
+        """Write the vectors to <path>.npy as int8 codes, with <path>.scales.npy and <path>.ids.npy
+
+        A trained IVFPQ index is also written to <path>.faiss so loading doesn't retrain it.
+        """
+        with self._lock:
+            matrix, ids, ann = self._matrix, self._ids, self._ann
+
+        if self._is_ivfpq(ann):
+            faiss.write_index(ann, f"{path}.faiss.tmp")
+            os.replace(f"{path}.faiss.tmp", f"{path}.faiss")
+
+        codes, scales = self.quantize(matrix) if len(ids) else (np.empty((0, self.dim), dtype=np.int8),
+                                                               np.empty(0, dtype=np.float32))
+        for suffix, array in (('.npy', codes), ('.scales.npy', scales), ('.ids.npy', ids)):
+            tmp_path = f"{path}{suffix}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, f"{path}{suffix}")
+
+    def load(self, path: str, ids: List[int], content_types: List[str]) -> bool:
+        """Replace the current contents with a save()d matrix, if it holds exactly these ids"""
+        try:
+            saved_ids = np.load(f"{path}.ids.npy")
+            codes = np.load(f"{path}.npy", mmap_mode='r')
+            scales = np.load(f"{path}.scales.npy")
+        except (OSError, ValueError):
+            return False
+
+        if (codes.dtype != np.int8 or codes.shape != (len(saved_ids), self.dim)
+                or scales.shape != saved_ids.shape or not np.array_equal(saved_ids, ids)):
+            return False
+
+        matrix = self.dequantize(codes, scales)
+        types = np.empty(len(content_types), dtype=object)
+        types[:] = content_types
+
+        ann = self._read_ivfpq(f"{path}.faiss", len(saved_ids)) if len(saved_ids) >= self.IVFPQ_MIN_SIZE else None
+        if ann is None:
+            ann = self._build_ann(matrix)
+
+        with self._lock:
+            self._matrix, self._ids, self._types, self._ann = matrix, saved_ids, types, ann
+        return True
+
+    def search(self, query: np.ndarray, k: int, content_type: Optional[str] = None,
+               min_similarity: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """Return the ids and similarities of the k nearest rows at or above min_similarity, best first"""
+        query = np.asarray(query, dtype=np.float32).reshape(self.dim)
+
+        with self._lock:
+            matrix, ids, types = self._matrix, self._ids, self._types
+            if content_type is None and self._ann is not None and len(ids):
+                scores, positions = self._ann.search(query[None, :], k)
+                found = (positions[0] >= 0) & (scores[0] >= min_similarity)
+                return ids[positions[0][found]], scores[0][found]
+
+        # Exact search; also used for filtered queries, which the graph can't restrict
+        if content_type is not None:
+            candidates = np.flatnonzero(types == content_type)
+            matrix, ids = matrix[candidates], ids[candidates]
+        if not len(ids):
+            return ids, np.empty(0, dtype=np.float32)
+
+        scores = matrix @ query
+        # Rows under the threshold can never be returned, so they never reach the top k
+        below = scores < min_similarity
+        scores[below] = -np.inf
+        k = min(k, len(scores) - int(np.count_nonzero(below)))
+        if k <= 0:
+            return ids[:0], scores[:0]
+
+        # O(N) partition to find the top k, then sort only those
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return ids[top], scores[top]
+
+    def _build_ann(self, matrix: np.ndarray):
+        """Approximate index over matrix: HNSW while small, IVFPQ (trained on matrix) once large"""
+        if faiss is None:
+            return None
+
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        if len(matrix) >= self.IVFPQ_MIN_SIZE:
+            quantizer = faiss.IndexFlatIP(self.dim)
+            index = faiss.IndexIVFPQ(quantizer, self.dim, self.IVF_LISTS, self.PQ_SUBVECTORS,
+                                     self.PQ_BITS, faiss.METRIC_INNER_PRODUCT)
+            index.train(matrix)
+            index.nprobe = self.IVF_NPROBE
+        else:
+            index = faiss.IndexHNSWFlat(self.dim, self.hnsw_neighbors, faiss.METRIC_INNER_PRODUCT)
+        if len(matrix):
+            index.add(matrix)
+        return index
+
+    def _read_ivfpq(self, path: str, expected_size: int):
+        if faiss is None or not os.path.exists(path):
+            return None
+        try:
+            index = faiss.read_index(path)
+        except Exception as e:
+            print(f"Reading IVFPQ index failed, rebuilding: {e}")
+            return None
+        if index.ntotal != expected_size or index.d != self.dim:
+            return None
+        index.nprobe = self.IVF_NPROBE
+        return index
+
+    @staticmethod
+    def _is_ivfpq(index) -> bool:
+        return faiss is not None and isinstance(index, faiss.IndexIVFPQ)